@@ -1,5 +1,6 @@
 import aiohttp
 import io
+import logging
 from datetime import datetime
 import re
 import asyncio
@@ -8,13 +9,14 @@ import random
 import asyncio
 from urllib.parse import quote
 from bot_utilities.config_loader import load_current_language, config
+from bot_utilities.metrics import UPSTREAM_REQUESTS
 from openai import AsyncOpenAI
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
+logger = logging.getLogger(__name__)
 current_language = load_current_language()
-internet_access = config['INTERNET_ACCESS']
 
 openai_client = AsyncOpenAI(
     api_key=os.getenv('CHIMERA_GPT_KEY'),
@@ -30,12 +32,13 @@ async def sdxl(prompt):
     )
     return response.data[0].url
 
-async def search(prompt):
+async def search(prompt, max_results=None):
     """
     Asynchronously searches for a prompt and returns the search results as a blob.
 
     Args:
         prompt (str): The prompt to search for.
+        max_results (int): Result limit, defaults to `MAX_SEARCH_RESULTS` from config.
 
     Returns:
         str: The search results as a blob.
@@ -43,9 +46,10 @@ async def search(prompt):
     Raises:
         None
     """
-    if not internet_access or len(prompt) > 200:
+    # Read per call so a reloaded INTERNET_ACCESS applies right away
+    if not config['INTERNET_ACCESS'] or len(prompt) > 200:
         return
-    search_results_limit = config['MAX_SEARCH_RESULTS']
+    search_results_limit = max_results or config['MAX_SEARCH_RESULTS']
 
     if url_match := re.search(r'(https?://\S+)', prompt):
         search_query = url_match.group(0)
@@ -64,8 +68,10 @@ async def search(prompt):
                                        params={'query': search_query, 'maxNumResults': search_results_limit}) as response:
                     search = await response.json()
         except aiohttp.ClientError as e:
-            print(f"An error occurred during the search request: {e}")
+            UPSTREAM_REQUESTS.inc("search", "error")
+            logger.warning("An error occurred during the search request: %s", e)
             return
+        UPSTREAM_REQUESTS.inc("search", "ok")
 
         for index, result in enumerate(search):
             try:
@@ -82,17 +88,23 @@ async def fetch_models():
     models = await openai_client.models.list()
     return models
     
-async def generate_response(instructions, search, history):
+async def generate_response(instructions, search, history, context=None, model=None):
     search_results = search if search is not None else "Search feature is disabled"
     messages = [
             {"role": "system", "name": "instructions", "content": instructions},
+            *([{"role": "system", "name": "context", "content": context}] if context else []),
             *history,
             {"role": "system", "name": "search_results", "content": search_results},
         ]
-    response = await openai_client.chat.completions.create(
-        model=config['GPT_MODEL'],
-        messages=messages
-    )
+    try:
+        response = await openai_client.chat.completions.create(
+            model=model or config['GPT_MODEL'],
+            messages=messages
+        )
+    except Exception:
+        UPSTREAM_REQUESTS.inc("llm", "error")
+        raise
+    UPSTREAM_REQUESTS.inc("llm", "ok")
     message = response.choices[0].message.content
     return message
 
@@ -138,7 +150,7 @@ async def dall_e_gen(model, prompt, size, num_images):
     
 
 async def generate_image_prodia(prompt, model, sampler, seed, neg):
-    print("\033[1;32m(Prodia) Creating image for :\033[0m", prompt)
+    logger.info("(Prodia) Creating image for: %s", prompt)
     start_time = time.time()
     async def create_job(prompt, model, sampler, seed, neg):
         if neg is None:
@@ -179,5 +191,6 @@ async def generate_image_prodia(prompt, model, sampler, seed, neg):
                         content = await response.content.read()
                         img_file_obj = io.BytesIO(content)
                         duration = time.time() - start_time
-                        print(f"\033[1;34m(Prodia) Finished image creation\n\033[0mJob id : {job_id}  Prompt : ", prompt, "in", duration, "seconds.")
+                        logger.info("(Prodia) Finished image creation, job id: %s, prompt: %s, in %.2f seconds",
+                                    job_id, prompt, duration, extra={"duration": duration})
                         return img_file_obj
\ No newline at end of file
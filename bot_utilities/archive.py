@@ -0,0 +1,128 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+import mysql.connector
+from bot_utilities.config_loader import config
+from bot_utilities.executors import run_in_pool
+
+logger = logging.getLogger(__name__)
+
+# Chat log archive in the MySQL `messages` table. Connections are per thread,
+# and every function here except `schedule_archive` blocks, so callers run
+# them in the io pool.
+
+# guild_id of direct messages; NULL means the row predates guild tracking
+DM_GUILD_ID = 0
+
+_local = threading.local()
+_pending = set()
+_archived_callbacks = []
+
+
+DB_VARIABLES = {'host': 'DB_HOST', 'user': 'DB_USER', 'password': 'DB_PASSWORD', 'database': 'DB_NAME'}
+
+
+def db_config():
+    """Returns the MySQL connection settings, raising RuntimeError when any DB_* variable is unset."""
+    missing = [variable for variable in DB_VARIABLES.values() if not os.getenv(variable)]
+    if missing:
+        raise RuntimeError(f"The message archive needs {', '.join(missing)} to be set (see baza.env)")
+    return {key: os.getenv(variable) for key, variable in DB_VARIABLES.items()}
+
+
+def get_connection():
+    connection = getattr(_local, "connection", None)
+    if connection is None or not connection.is_connected():
+        connection = _local.connection = mysql.connector.connect(**db_config(), autocommit=True)
+        _create_table(connection)
+    return connection
+
+
+def _create_table(connection):
+    cursor = connection.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS messages (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            user_id BIGINT,
+            channel_id BIGINT,
+            guild_id BIGINT,
+            content TEXT,
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    # Tables created before channels and guilds were recorded
+    for column, after in (('channel_id', 'user_id'), ('guild_id', 'channel_id')):
+        try:
+            cursor.execute(f'ALTER TABLE messages ADD COLUMN {column} BIGINT AFTER {after}')
+        except mysql.connector.Error as e:
+            if e.errno != 1060:  # Duplicate column name
+                raise
+    cursor.close()
+
+
+def on_archived(callback):
+    """
+    Registers a callback that receives every archived row as
+    (id, user_id, channel_id, guild_id, content, unix time). Callbacks run in
+    the io pool right after the insert.
+    """
+    _archived_callbacks.append(callback)
+    return callback
+
+
+def should_archive(message):
+    if not config.get('ARCHIVE_MESSAGES', False) or message.author.bot or not message.content:
+        return False
+    channels = config.get('ARCHIVE_CHANNELS') or []
+    return not channels or message.channel.id in channels
+
+
+def archive_message(user_id, channel_id, guild_id, content):
+    """Inserts a message and returns its id."""
+    cursor = get_connection().cursor()
+    try:
+        cursor.execute('INSERT INTO messages (user_id, channel_id, guild_id, content) VALUES (%s, %s, %s, %s)',
+                       (user_id, channel_id, guild_id, content))
+        return cursor.lastrowid
+    finally:
+        cursor.close()
+
+
+def _archive(user_id, channel_id, guild_id, content):
+    row = (archive_message(user_id, channel_id, guild_id, content), user_id, channel_id, guild_id, content,
+           time.time())
+    for callback in _archived_callbacks:
+        callback(row)
+
+
+def _archived(task):
+    _pending.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("Failed to archive a message: %s", task.exception())
+
+
+def schedule_archive(message):
+    """Archives `message` in the background, so replies never wait on MySQL."""
+    task = asyncio.create_task(
+        run_in_pool("io", _archive, message.author.id, message.channel.id,
+                    message.guild.id if message.guild else DM_GUILD_ID, message.content))
+    _pending.add(task)
+    task.add_done_callback(_archived)
+
+
+def fetch_messages(after_id, limit=1000):
+    """
+    Returns up to `limit` rows (id, user_id, channel_id, guild_id, content,
+    unix time) with id > after_id.
+    """
+    cursor = get_connection().cursor()
+    try:
+        cursor.execute('''
+            SELECT id, user_id, channel_id, guild_id, content, UNIX_TIMESTAMP(timestamp)
+            FROM messages WHERE id > %s ORDER BY id LIMIT %s
+        ''', (after_id, limit))
+        return [(*row, float(ts)) for *row, ts in cursor]
+    finally:
+        cursor.close()
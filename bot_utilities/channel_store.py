@@ -0,0 +1,187 @@
+import asyncio
+import json
+import logging
+import os
+import tempfile
+from bot_utilities.storage import bump_version, get_connection
+from bot_utilities.executors import run_in_pool
+
+logger = logging.getLogger(__name__)
+
+
+class JsonChannelBackend:
+    def __init__(self, path="channels.json"):
+        self.path = path
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path, "r", encoding='utf-8') as f:
+            return json.load(f)
+
+    def save(self, channels, changed):
+        # Write to a temp file in the same directory and rename it over the
+        # old one, so a crash mid-write never leaves a truncated file behind
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".channels.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding='utf-8') as f:
+                json.dump(channels, f, indent=4)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+
+def _split_entry(entry):
+    # Entries are a persona name, or a dict of the persona and channel options
+    if not isinstance(entry, dict):
+        return entry, None
+    options = {key: value for key, value in entry.items() if key != 'persona'}
+    return entry['persona'], json.dumps(options) if options else None
+
+
+class SqliteChannelBackend:
+    def __init__(self, import_from="channels.json"):
+        self.import_from = import_from
+
+    def load(self):
+        connection = get_connection()
+        connection.execute('''
+            CREATE TABLE IF NOT EXISTS active_channels (
+                channel_id TEXT PRIMARY KEY,
+                persona TEXT NOT NULL,
+                options TEXT
+            )
+        ''')
+        columns = [row[1] for row in connection.execute('PRAGMA table_info(active_channels)')]
+        if 'options' not in columns:
+            connection.execute('ALTER TABLE active_channels ADD COLUMN options TEXT')
+        channels = {
+            channel_id: dict(json.loads(options), persona=persona) if options else persona
+            for channel_id, persona, options in connection.execute(
+                'SELECT channel_id, persona, options FROM active_channels')
+        }
+        if not channels and self.import_from and os.path.exists(self.import_from):
+            # One-time migration from the JSON registry
+            channels = JsonChannelBackend(self.import_from).load()
+            self.save(channels, channels.keys())
+        # Reloads must not re-import it once every channel was deactivated
+        self.import_from = None
+        connection.commit()
+        return channels
+
+    def save(self, channels, changed):
+        # Only the changed rows are written, regardless of the registry size
+        connection = get_connection()
+        with connection:
+            connection.executemany('REPLACE INTO active_channels (channel_id, persona, options) VALUES (?, ?, ?)',
+                                   [(channel_id, *_split_entry(channels[channel_id])) for channel_id in changed
+                                    if channel_id in channels])
+            connection.executemany('DELETE FROM active_channels WHERE channel_id = ?',
+                                   [(channel_id,) for channel_id in changed if channel_id not in channels])
+            bump_version(connection, 'active_channels')
+
+
+class ChannelStore:
+    """
+    Active channel registry with deferred persistence.
+
+    Each channel ID maps to a persona name, or to a dict holding the persona
+    and per-channel options (e.g. {"persona": "assist", "response_cache": true}).
+
+    Changes are applied in memory immediately. Writes happen off the event
+    loop after `save_delay` seconds, so a burst of toggles results in a single
+    write of the latest state.
+    """
+
+    def __init__(self, backend, save_delay=1.0):
+        self.backend = backend
+        self.save_delay = save_delay
+        self._channels = backend.load()
+        self._dirty = set()
+        self._save_task = None
+
+    def __contains__(self, channel_id):
+        return channel_id in self._channels
+
+    def __getitem__(self, channel_id):
+        return self._channels[channel_id]
+
+    def __setitem__(self, channel_id, persona):
+        self._channels[channel_id] = persona
+        self._mark_dirty(channel_id)
+
+    def __delitem__(self, channel_id):
+        del self._channels[channel_id]
+        self._mark_dirty(channel_id)
+
+    def __len__(self):
+        return len(self._channels)
+
+    def __iter__(self):
+        return iter(self._channels)
+
+    def get(self, channel_id, default=None):
+        return self._channels.get(channel_id, default)
+
+    def items(self):
+        return self._channels.items()
+
+    def persona(self, channel_id):
+        entry = self._channels[channel_id]
+        return entry['persona'] if isinstance(entry, dict) else entry
+
+    def options(self, channel_id):
+        entry = self._channels.get(channel_id)
+        if not isinstance(entry, dict):
+            return {}
+        return {key: value for key, value in entry.items() if key != 'persona'}
+
+    def set_option(self, channel_id, key, value):
+        options = self.options(channel_id)
+        options[key] = value
+        self[channel_id] = dict(options, persona=self.persona(channel_id))
+
+    def _mark_dirty(self, channel_id):
+        self._dirty.add(channel_id)
+        if self._save_task is None or self._save_task.done():
+            self._save_task = asyncio.get_running_loop().create_task(self._save_later())
+
+    async def _save_later(self):
+        await asyncio.sleep(self.save_delay)
+        while self._dirty:
+            changed, self._dirty = self._dirty, set()
+            try:
+                await run_in_pool("io", self.backend.save, dict(self._channels), changed)
+            except Exception:
+                logger.exception("Failed to save active channels")
+                self._dirty |= changed
+                return
+
+    async def reload(self):
+        """Re-reads the registry, e.g. after another process changed it."""
+        channels = await run_in_pool("io", self.backend.load)
+        # Changes not saved yet are newer than the stored state
+        for channel_id in self._dirty:
+            if channel_id in self._channels:
+                channels[channel_id] = self._channels[channel_id]
+            else:
+                channels.pop(channel_id, None)
+        self._channels = channels
+
+    def flush(self):
+        """Synchronously writes pending changes, used on shutdown."""
+        if self._dirty:
+            changed, self._dirty = self._dirty, set()
+            self.backend.save(dict(self._channels), changed)
+
+
+def create_channel_store(config):
+    if config.get('CHANNELS_BACKEND', 'json') == 'sqlite':
+        backend = SqliteChannelBackend()
+    else:
+        backend = JsonChannelBackend()
+    return ChannelStore(backend, save_delay=config.get('CHANNELS_SAVE_DELAY', 1.0))
@@ -1,37 +1,181 @@
 import yaml
 import json
+import logging
 import os
+import asyncio
 
-# Config load
-with open('config.yml', 'r', encoding='utf-8') as config_file:
-    config = yaml.safe_load(config_file)
+logger = logging.getLogger(__name__)
 
-## Language settings ##
-valid_language_codes = []
+config_path = 'config.yml'
 lang_directory = "lang"
+instructions_directory = "instructions"
 
-current_language_code = config['LANGUAGE']
+# Parsed state kept in memory. The objects are updated in place on reload so
+# modules that imported them keep seeing the current values.
+config = {}
+valid_language_codes = []
+languages = {}
+instructions = {}
 
-for filename in os.listdir(lang_directory):
-    if filename.startswith("lang.") and filename.endswith(".json") and os.path.isfile(
-            os.path.join(lang_directory, filename)):
-        language_code = filename.split(".")[1]
-        valid_language_codes.append(language_code)
+_reload_callbacks = []
+_mtimes = {}
 
-def load_current_language():
-    lang_file_path = os.path.join(
-        lang_directory, f"lang.{current_language_code}.json")
-    with open(lang_file_path, encoding="utf-8") as lang_file:
-        current_language = json.load(lang_file)
-    return current_language
+# Keys the code reads without a default
+REQUIRED_KEYS = ('ALLOW_DM', 'SMART_MENTION', 'TRIGGER', 'PRESENCES', 'PRESENCES_CHANGE_DELAY', 'DISABLE_PRESENCE',
+                 'BLACKLIST_WORDS', 'AI_NSFW_CONTENT_FILTER', 'INTERNET_ACCESS', 'INSTRUCTIONS', 'MAX_HISTORY',
+                 'GPT_MODEL', 'LANGUAGE', 'MAX_SEARCH_RESULTS')
 
-# Instructions loader
-def load_instructions(instruction):
-    for file_name in os.listdir("instructions"):
+
+def _read_config():
+    with open(config_path, 'r', encoding='utf-8') as config_file:
+        return yaml.safe_load(config_file)
+
+
+def _read_languages():
+    tables = {}
+    for filename in os.listdir(lang_directory):
+        if filename.startswith("lang.") and filename.endswith(".json") and os.path.isfile(
+                os.path.join(lang_directory, filename)):
+            language_code = filename.split(".")[1]
+            with open(os.path.join(lang_directory, filename), encoding="utf-8") as lang_file:
+                tables[language_code] = json.load(lang_file)
+    return tables
+
+
+def _read_instructions():
+    prompts = {}
+    for file_name in os.listdir(instructions_directory):
         if file_name.endswith('.txt'):
-            file_path = os.path.join("instructions", file_name)
+            file_path = os.path.join(instructions_directory, file_name)
             with open(file_path, 'r', encoding='utf-8') as file:
-                file_content = file.read()
-            # Use the file name without extension as the variable name
-                variable_name = file_name.split('.')[0]
-                instruction[variable_name] = file_content
\ No newline at end of file
+                # Use the file name without extension as the variable name
+                prompts[file_name.split('.')[0]] = file.read()
+    return prompts
+
+
+def _validate(new_config, new_languages, new_instructions):
+    if not isinstance(new_config, dict):
+        raise ValueError(f"{config_path} must be a mapping of settings")
+    missing = [key for key in REQUIRED_KEYS if key not in new_config]
+    if missing:
+        raise ValueError(f"Missing settings in {config_path}: {', '.join(missing)}")
+    if new_config['LANGUAGE'] not in new_languages:
+        raise ValueError(f"Unknown language code: {new_config['LANGUAGE']} (valid: {', '.join(sorted(new_languages))})")
+    if new_config['INSTRUCTIONS'] not in new_instructions:
+        raise ValueError(f"Unknown persona: {new_config['INSTRUCTIONS']}")
+
+
+def _watched_files():
+    paths = [config_path]
+    for directory in (lang_directory, instructions_directory):
+        paths.extend(os.path.join(directory, name) for name in os.listdir(directory))
+    return paths
+
+
+def _snapshot_mtimes():
+    mtimes = {}
+    for file_path in _watched_files():
+        try:
+            mtimes[file_path] = os.stat(file_path).st_mtime_ns
+        except FileNotFoundError:
+            pass
+    return mtimes
+
+
+def _read_state():
+    # Blocking: file reads and YAML/JSON parsing
+    new_config = _read_config()
+    new_languages = _read_languages()
+    new_instructions = _read_instructions()
+    _validate(new_config, new_languages, new_instructions)
+    return new_config, new_languages, new_instructions
+
+
+def _apply_state(new_config, new_languages, new_instructions):
+    global current_language_code
+    config.clear()
+    config.update(new_config)
+    languages.clear()
+    languages.update(new_languages)
+    valid_language_codes[:] = sorted(new_languages)
+    instructions.clear()
+    instructions.update(new_instructions)
+    current_language_code = config['LANGUAGE']
+
+    for callback in _reload_callbacks:
+        try:
+            callback()
+        except Exception:
+            logger.exception("Reload callback %s failed", callback.__name__)
+
+
+def reload_config():
+    """
+    Re-reads config.yml, the language tables and the persona prompts.
+
+    Everything is parsed and validated first and only then swapped in, so a
+    broken file leaves the previous state untouched. A failing reload
+    callback is logged and does not stop the others.
+
+    Returns:
+        bool: True if the new state was applied.
+    """
+    try:
+        state = _read_state()
+    except (OSError, ValueError, yaml.YAMLError) as e:
+        logger.error("Failed to reload configuration, keeping the previous one: %s", e)
+        return False
+    _apply_state(*state)
+    return True
+
+
+def on_reload(callback):
+    """Registers a callback that runs after every successful reload."""
+    _reload_callbacks.append(callback)
+    return callback
+
+
+async def watch_config(interval=None):
+    """
+    Polls the watched files for mtime changes and reloads on change. Files
+    are checked and parsed in the io pool; only the swap runs on the loop.
+    """
+    # Imported here: the executors read their pool sizes from this config
+    from bot_utilities.executors import run_in_pool
+    while True:
+        await asyncio.sleep(interval or config.get('CONFIG_RELOAD_INTERVAL', 5))
+        try:
+            mtimes = await run_in_pool("io", _snapshot_mtimes)
+            if mtimes == _mtimes:
+                continue
+            _mtimes.clear()
+            _mtimes.update(mtimes)
+            state = await run_in_pool("io", _read_state)
+        except (OSError, ValueError, yaml.YAMLError) as e:
+            # A directory missing mid-deploy is retried next interval, a
+            # broken file once it changes again
+            logger.error("Failed to reload configuration, keeping the previous one: %s", e)
+            continue
+        _apply_state(*state)
+        logger.info("Configuration reloaded")
+
+
+## Language settings ##
+def load_current_language(language_code=None):
+    global current_language_code
+    if language_code is not None:
+        if language_code not in languages:
+            raise ValueError(f"Unknown language code: {language_code}")
+        current_language_code = language_code
+    return languages[current_language_code]
+
+
+# Instructions loader
+def load_instructions(instruction):
+    instruction.update(instructions)
+
+
+current_language_code = None
+if not reload_config():
+    raise RuntimeError("Could not load the configuration")
+_mtimes.update(_snapshot_mtimes())
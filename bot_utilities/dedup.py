@@ -0,0 +1,135 @@
+import asyncio
+import hashlib
+import re
+import time
+from bot_utilities.config_loader import config, on_reload
+from bot_utilities.metrics import Counter
+
+DUPLICATE_MESSAGES = Counter("bot_duplicate_messages_total",
+                             "Triggering messages identical to one seen within DEDUP_WINDOW, by action taken",
+                             ("action",))
+
+_PUNCTUATION = re.compile(r'[^\w\s]')
+_WHITESPACE = re.compile(r'\s+')
+
+
+def fingerprint(content):
+    """Returns (8-byte hash, normalized text) of a message's content."""
+    normalized = _WHITESPACE.sub(' ', _PUNCTUATION.sub('', content.lower())).strip()
+    return hashlib.blake2b(normalized.encode(), digest_size=8).digest(), normalized
+
+
+class DuplicateEntry:
+    __slots__ = ("sample", "hits", "channels", "responses")
+
+    def __init__(self, sample):
+        self.sample = sample
+        self.hits = 0
+        self.channels = set()
+        self.responses = {}  # share key -> Future of the shared generation
+
+
+class DuplicateIndex:
+    """
+    Fingerprints of recent triggering messages, kept in a ring of time slots.
+    Messages are only compared within their scope (a guild, or one DM
+    channel), so a text posted elsewhere never counts as a duplicate.
+
+    The ring has `slots` slots of `window / slots` seconds each. A slot is
+    emptied when the ring wraps around to it, so memory is bounded by the
+    traffic of one window and lookups only see the last `window` seconds.
+    """
+
+    def __init__(self, window=30, slots=6, min_length=20):
+        self.ring = [[-1, {}] for _ in range(slots)]
+        self.configure(window, min_length)
+
+    def configure(self, window, min_length):
+        slot_seconds = window / len(self.ring)
+        if slot_seconds != getattr(self, "slot_seconds", slot_seconds):
+            # Slot epochs change meaning with the slot length
+            self.ring = [[-1, {}] for _ in self.ring]
+        self.slot_seconds = slot_seconds
+        self.min_length = min_length
+
+    def _live_slots(self, now):
+        epoch = int(now // self.slot_seconds)
+        return [entries for slot_epoch, entries in self.ring if epoch - slot_epoch < len(self.ring)]
+
+    def record(self, content, scope, channel_id):
+        """
+        Counts a triggering message.
+
+        Args:
+            content (str): Message content.
+            scope: ("guild", guild_id) or ("dm", channel_id).
+            channel_id (int): Channel the message was sent in.
+
+        Returns:
+            DuplicateEntry: The entry for the message's content, or None for
+            messages too short to fingerprint.
+        """
+        if len(content) < self.min_length:
+            return None
+        digest, normalized = fingerprint(content)
+        key = (scope, digest)
+        now = time.monotonic()
+        for entries in self._live_slots(now):
+            if key in entries:
+                entry = entries[key]
+                break
+        else:
+            epoch = int(now // self.slot_seconds)
+            slot = self.ring[epoch % len(self.ring)]
+            if slot[0] != epoch:
+                slot[0] = epoch
+                slot[1] = {}
+            entry = slot[1][key] = DuplicateEntry(normalized[:100])
+        entry.hits += 1
+        entry.channels.add(channel_id)
+        return entry
+
+    async def share(self, entry, key, generate):
+        """
+        Runs `generate()` once per entry and key; duplicates await the first
+        call's result instead of starting their own. The key must cover
+        everything the generation depends on besides the content (persona,
+        settings), so an answer is only shared where it would be the same.
+        """
+        if entry is None:
+            return await generate()
+        future = entry.responses.get(key)
+        if future is not None:
+            DUPLICATE_MESSAGES.inc("shared")
+            return await asyncio.shield(future)
+        future = entry.responses[key] = asyncio.get_running_loop().create_future()
+        try:
+            response = await generate()
+        except asyncio.CancelledError:
+            del entry.responses[key]
+            future.set_result(None)
+            raise
+        except Exception as e:
+            # Duplicates fail the same way; a later copy may try again
+            del entry.responses[key]
+            future.set_exception(e)
+            future.exception()
+            raise
+        future.set_result(response)
+        return response
+
+    def top(self, scope, n=10):
+        """Most repeated messages of a scope in the window as (sample, hits, channel count)."""
+        entries = [entry for slot in self._live_slots(time.monotonic())
+                   for (entry_scope, _), entry in slot.items() if entry_scope == scope]
+        entries.sort(key=lambda entry: entry.hits, reverse=True)
+        return [(entry.sample, entry.hits, len(entry.channels)) for entry in entries[:n] if entry.hits > 1]
+
+
+duplicates = DuplicateIndex(window=config.get('DEDUP_WINDOW', 30),
+                            min_length=config.get('DEDUP_MIN_LENGTH', 20))
+
+
+@on_reload
+def configure_duplicates():
+    duplicates.configure(config.get('DEDUP_WINDOW', 30), config.get('DEDUP_MIN_LENGTH', 20))
@@ -1,18 +1,58 @@
 import discord
+import logging
 from discord.ext import commands
 
-intents = discord.Intents.all()
+logger = logging.getLogger(__name__)
+
+
+def build_intents(profile):
+    """
+    Builds the gateway intents for a profile.
+
+    full: everything, including presences and the member list.
+    standard: default intents plus members and message content, no presences.
+    minimal: only what answering messages needs (guilds, guild/DM messages,
+        message content). Members and presences are not received or cached.
+    """
+    if profile == "full":
+        return discord.Intents.all()
+    if profile == "standard":
+        intents = discord.Intents.default()
+        intents.members = True
+        intents.message_content = True
+        return intents
+    if profile == "minimal":
+        return discord.Intents(guilds=True, guild_messages=True, dm_messages=True, message_content=True)
+    raise ValueError(f"Unknown intents profile: {profile}")
+
+
+def build_client_options(config):
+    """Returns the intents and cache options for the bot from config."""
+    intents = build_intents(config.get('INTENTS_PROFILE', 'full'))
+    member_cache = config.get('MEMBER_CACHE', 'auto')
+    if member_cache == 'none':
+        member_cache_flags = discord.MemberCacheFlags.none()
+    else:
+        member_cache_flags = discord.MemberCacheFlags.from_intents(intents)
+    chunk_guilds = config.get('CHUNK_GUILDS_AT_STARTUP')
+    return {
+        "intents": intents,
+        "member_cache_flags": member_cache_flags,
+        "chunk_guilds_at_startup": intents.members if chunk_guilds is None else chunk_guilds,
+        "max_messages": config.get('MAX_MESSAGES', 1000) or None,
+    }
+
 
 async def check_token(TOKEN):
     try:
         client = commands.Bot(command_prefix="/",
-                              intents=intents, heartbeat_timeout=60)
+                              intents=discord.Intents.none(), heartbeat_timeout=60)
         await client.login(TOKEN)
     except discord.LoginFailure:
-        print("\033[31mDiscord Token environment variable is invalid\033[0m")
+        logger.error("Discord Token environment variable is invalid")
         return None
     else:
-        print("\033[32mDiscord Token environment variable is valid\033[0m")
+        logger.info("Discord Token environment variable is valid")
     finally:
         await client.close()
 
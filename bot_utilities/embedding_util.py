@@ -0,0 +1,51 @@
+import zlib
+from bot_utilities.dedup import fingerprint
+
+try:
+    import numpy as np
+except ImportError:  # Optional, only the semantic cache and memory need it
+    np = None
+
+# Hashed n-gram embeddings: every word, word pair and character trigram of the
+# normalized text is hashed into one of `dim` signed buckets. Paraphrases
+# share most words and trigrams, so their vectors end up close, and no
+# model has to be downloaded or loaded.
+
+DEFAULT_DIM = 512
+FEATURES_VERSION = 2  # Bump when _features changes, stored vectors are then rebuilt
+
+
+def _features(text):
+    _, normalized = fingerprint(text)
+    words = normalized.split()
+    # Word pairs keep some word order ("celsius to fahrenheit" vs the reverse)
+    features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    for word in words:
+        padded = f" {word} "
+        features.extend(padded[i:i + 3] for i in range(len(padded) - 2))
+    return features
+
+
+def embed(text, dim=DEFAULT_DIM):
+    """
+    Returns the L2-normalized float32 embedding of a text.
+
+    Args:
+        dim (int): Vector size, must be a power of two.
+    """
+    hashes = [zlib.crc32(feature.encode()) for feature in _features(text)]
+    vector = np.zeros(dim, dtype=np.float32)
+    if hashes:
+        hashes = np.array(hashes, dtype=np.uint32)
+        signs = np.where(hashes >> 31, -1.0, 1.0).astype(np.float32)
+        vector += np.bincount(hashes & (dim - 1), weights=signs, minlength=dim).astype(np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def embed_many(texts, dim=DEFAULT_DIM):
+    """Embeds texts into a (len(texts), dim) float32 matrix."""
+    matrix = np.zeros((len(texts), dim), dtype=np.float32)
+    for row, text in enumerate(texts):
+        matrix[row] = embed(text, dim)
+    return matrix
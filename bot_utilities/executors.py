@@ -0,0 +1,51 @@
+import asyncio
+import functools
+import multiprocessing
+import os
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from bot_utilities.config_loader import config
+from bot_utilities.metrics import QUEUE_DEPTH
+
+# Named pools: "io" (threads) for blocking I/O such as file and database
+# access, "cpu" (processes) for CPU-heavy work that would hold the GIL.
+_pools = {}
+_pending = {}
+
+
+def get_pool(name):
+    if (pool := _pools.get(name)) is None:
+        if name == "cpu":
+            # Forking a process that already runs threads (logging, the loop
+            # watchdog, the io pool) can copy a held lock into the child
+            pool = ProcessPoolExecutor(max_workers=config.get('CPU_WORKERS') or os.cpu_count(),
+                                       mp_context=multiprocessing.get_context("forkserver"))
+        else:
+            pool = ThreadPoolExecutor(max_workers=config.get('IO_WORKERS', 8),
+                                      thread_name_prefix=f"{name}-pool")
+        _pools[name] = pool
+    return pool
+
+
+async def run_in_pool(pool, func, *args, **kwargs):
+    """
+    Runs `func(*args, **kwargs)` in the named pool without blocking the loop.
+
+    Functions sent to the "cpu" pool and their arguments must be picklable,
+    i.e. plain module-level functions. Its processes import the main script
+    again (as __mp_main__), so the script's startup work belongs under
+    `if __name__ == "__main__"`.
+    """
+    loop = asyncio.get_running_loop()
+    _pending[pool] = _pending.get(pool, 0) + 1
+    QUEUE_DEPTH.set(_pending[pool], f"{pool}_pool")
+    try:
+        return await loop.run_in_executor(get_pool(pool), functools.partial(func, *args, **kwargs))
+    finally:
+        _pending[pool] -= 1
+        QUEUE_DEPTH.set(_pending[pool], f"{pool}_pool")
+
+
+def shutdown_pools():
+    for pool in _pools.values():
+        pool.shutdown(wait=True, cancel_futures=True)
+    _pools.clear()
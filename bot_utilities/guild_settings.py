@@ -0,0 +1,133 @@
+import json
+import re
+from bot_utilities.config_loader import config, on_reload, valid_language_codes, instructions, languages, load_current_language
+from bot_utilities.executors import run_in_pool
+from bot_utilities.storage import bump_version, get_connection
+from bot_utilities.metrics import CACHE_REQUESTS
+
+# Settings from config.yml that can be overridden per guild
+GUILD_SETTINGS = ('ALLOW_DM', 'SMART_MENTION', 'MAX_HISTORY', 'GPT_MODEL', 'LANGUAGE',
+                  'MAX_SEARCH_RESULTS', 'TRIGGER', 'INSTRUCTIONS')
+
+_overrides = None
+_effective = {}
+
+
+def compile_triggers(words):
+    if not words:
+        return None
+    return re.compile("|".join(re.escape(word) for word in words))
+
+
+def _read_overrides():
+    connection = get_connection()
+    connection.execute('''
+        CREATE TABLE IF NOT EXISTS guild_settings (
+            guild_id INTEGER NOT NULL,
+            key TEXT NOT NULL,
+            value TEXT NOT NULL,
+            PRIMARY KEY (guild_id, key)
+        )
+    ''')
+    connection.commit()
+    overrides = {}
+    for guild_id, key, value in connection.execute('SELECT guild_id, key, value FROM guild_settings'):
+        overrides.setdefault(guild_id, {})[key] = json.loads(value)
+    return overrides
+
+
+def _load_overrides():
+    global _overrides
+    _overrides = _read_overrides()
+
+
+async def reload_guild_settings():
+    """
+    Re-reads the overrides in the io pool (at startup, and when another
+    process changed them) and swaps them in at once, so lookups on the
+    loop never wait for the database.
+    """
+    global _overrides
+    overrides = await run_in_pool("io", _read_overrides)
+    _overrides = overrides
+    _effective.clear()
+
+
+def get_guild_settings(guild_id):
+    """
+    Returns the effective settings for a guild.
+
+    Global config values are merged with the guild's overrides once and the
+    result is cached, so repeated lookups are a single dict access.
+
+    Args:
+        guild_id (int): The guild ID, or None for DMs (global settings only).
+
+    Returns:
+        dict: Setting name to value, plus the compiled `TRIGGER_PATTERN`.
+    """
+    if (settings := _effective.get(guild_id)) is not None:
+        CACHE_REQUESTS.inc("guild_settings", "hit")
+        return settings
+    CACHE_REQUESTS.inc("guild_settings", "miss")
+    if _overrides is None:
+        # Only before reload_guild_settings() ran, e.g. outside the bot
+        _load_overrides()
+    settings = {key: config[key] for key in GUILD_SETTINGS}
+    settings.update(_overrides.get(guild_id, {}))
+    settings['TRIGGER_PATTERN'] = compile_triggers(settings['TRIGGER'])
+    _effective[guild_id] = settings
+    return settings
+
+
+def get_guild_language(guild_id):
+    """Returns the language table (lang/lang.<code>.json) of the guild's LANGUAGE setting."""
+    # A language file removed since the override was set falls back to the global one
+    return languages.get(get_guild_settings(guild_id)['LANGUAGE']) or load_current_language()
+
+
+def validate_setting(key, value):
+    if key not in GUILD_SETTINGS:
+        raise ValueError(f"Unknown setting: {key}")
+    expected = type(config[key])
+    if expected is int and isinstance(value, bool) or not isinstance(value, expected):
+        raise ValueError(f"{key} must be of type {expected.__name__}")
+    if key in ('MAX_HISTORY', 'MAX_SEARCH_RESULTS') and value < 1:
+        raise ValueError(f"{key} must be at least 1")
+    if key == 'TRIGGER' and not all(isinstance(word, str) and word.strip() for word in value):
+        raise ValueError("TRIGGER must be a list of non-empty words")
+    if key == 'LANGUAGE' and value not in valid_language_codes:
+        raise ValueError(f"Unknown language code: {value}")
+    if key == 'INSTRUCTIONS' and value not in instructions:
+        raise ValueError(f"Unknown persona: {value}")
+
+
+def set_guild_setting(guild_id, key, value):
+    validate_setting(key, value)
+    if _overrides is None:
+        _load_overrides()
+    connection = get_connection()
+    with connection:
+        connection.execute('REPLACE INTO guild_settings (guild_id, key, value) VALUES (?, ?, ?)',
+                           (guild_id, key, json.dumps(value)))
+        bump_version(connection, 'guild_settings')
+    _overrides.setdefault(guild_id, {})[key] = value
+    _effective.pop(guild_id, None)
+
+
+def reset_guild_setting(guild_id, key):
+    if _overrides is None:
+        _load_overrides()
+    connection = get_connection()
+    with connection:
+        connection.execute('DELETE FROM guild_settings WHERE guild_id = ? AND key = ?', (guild_id, key))
+        bump_version(connection, 'guild_settings')
+    _overrides.get(guild_id, {}).pop(key, None)
+    _effective.pop(guild_id, None)
+
+
+@on_reload
+def invalidate_guild_settings():
+    # The global defaults changed; overrides changed by other processes are
+    # picked up by reload_guild_settings()
+    _effective.clear()
@@ -0,0 +1,66 @@
+import math
+import os
+from aiohttp import web
+from bot_utilities import loop_monitor
+from bot_utilities.metrics import render, QUEUE_DEPTH
+
+
+def get_health(bot, config):
+    """
+    Collects the bot's health state.
+
+    Returns:
+        tuple: (alive, ready, details) where `alive` is False when the event
+        loop is stalled and `ready` is False when the gateway is not usable or
+        a queue is saturated.
+    """
+    latency = bot.latency
+    connected = bot.is_ready() and not bot.is_closed() and math.isfinite(latency)
+    queues = {labels[0]: depth for labels, depth in QUEUE_DEPTH._values.items()}
+    saturated = [name for name, depth in queues.items()
+                 if name != "event_loop_tasks" and depth > config.get('HEALTH_MAX_QUEUE_DEPTH', 1000)]
+    alive = loop_monitor.loop_lag < config.get('HEALTH_MAX_LOOP_LAG', 5)
+    ready = (alive and connected and not saturated
+             and latency < config.get('HEALTH_MAX_GATEWAY_LATENCY', 10))
+    details = {
+        "gateway_connected": connected,
+        "gateway_latency": latency if math.isfinite(latency) else None,
+        "loop_lag": loop_monitor.loop_lag,
+        "queues": queues,
+        "saturated_queues": saturated,
+    }
+    return alive, ready, details
+
+
+def create_health_app(bot, config):
+    async def index(request):
+        return web.Response(text="Hey there! I'm Online!")
+
+    async def healthz(request):
+        alive, _, details = get_health(bot, config)
+        return web.json_response(details, status=200 if alive else 503)
+
+    async def readyz(request):
+        _, ready, details = get_health(bot, config)
+        return web.json_response(details, status=200 if ready else 503)
+
+    async def metrics(request):
+        return web.Response(text=render(), content_type="text/plain", charset="utf-8")
+
+    app = web.Application()
+    app.router.add_get('/', index)
+    app.router.add_get('/healthz', healthz)
+    app.router.add_get('/readyz', readyz)
+    app.router.add_get('/metrics', metrics)
+    return app
+
+
+async def start_health_server(bot, config):
+    """Starts the health server on the running event loop and returns its runner."""
+    runner = web.AppRunner(create_health_app(bot, config), access_log=None)
+    await runner.setup()
+    # Each process of a cluster listens on HEALTH_PORT + its cluster ID
+    port = config.get('HEALTH_PORT', 8080) + int(os.getenv('CLUSTER_ID', 0))
+    site = web.TCPSite(runner, config.get('HEALTH_HOST', '0.0.0.0'), port)
+    await site.start()
+    return runner
@@ -0,0 +1,93 @@
+import json
+from bot_utilities.storage import get_connection
+from bot_utilities.executors import run_in_pool
+
+
+class HistoryStore:
+    """In-process conversation memory keyed by "<user id>-<channel id>"."""
+
+    def __init__(self):
+        self._history = {}
+
+    async def load(self, key, limit):
+        """Returns a copy of the conversation, trimmed to its last `limit` messages."""
+        history = self._history.setdefault(key, [])
+        if limit:
+            del history[:-limit]
+        return list(history)
+
+    async def append(self, key, message):
+        self._history.setdefault(key, []).append(message)
+
+    async def clear(self, key):
+        """Clears a conversation, returns False if there was none."""
+        if key not in self._history:
+            return False
+        self._history[key].clear()
+        return True
+
+
+def _create_table():
+    connection = get_connection()
+    connection.execute('''
+        CREATE TABLE IF NOT EXISTS conversation_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            key TEXT NOT NULL,
+            message TEXT NOT NULL
+        )
+    ''')
+    connection.execute('CREATE INDEX IF NOT EXISTS conversation_history_key ON conversation_history (key, id)')
+    connection.commit()
+
+
+def _fetch_history(key, limit):
+    rows = get_connection().execute(
+        'SELECT message FROM conversation_history WHERE key = ? ORDER BY id DESC LIMIT ?', (key, limit)).fetchall()
+    return [json.loads(message) for message, in reversed(rows)]
+
+
+def _append_history(key, message, keep):
+    connection = get_connection()
+    with connection:
+        connection.execute('INSERT INTO conversation_history (key, message) VALUES (?, ?)',
+                           (key, json.dumps(message)))
+        connection.execute('''
+            DELETE FROM conversation_history WHERE key = ? AND id <= (
+                SELECT id FROM conversation_history WHERE key = ? ORDER BY id DESC LIMIT 1 OFFSET ?
+            )
+        ''', (key, key, keep))
+
+
+def _clear_history(key):
+    connection = get_connection()
+    with connection:
+        return connection.execute('DELETE FROM conversation_history WHERE key = ?', (key,)).rowcount > 0
+
+
+class SqliteHistoryStore(HistoryStore):
+    """
+    Conversation memory persisted in the local SQLite database, so it survives
+    restarts and is shared by every process of a cluster. Nothing is cached
+    in memory: another process may have appended to or cleared a
+    conversation, so every load reads the (indexed) table.
+    """
+
+    def __init__(self, keep=50):
+        super().__init__()
+        self.keep = keep
+        _create_table()
+
+    async def load(self, key, limit):
+        return await run_in_pool("io", _fetch_history, key, min(limit or self.keep, self.keep))
+
+    async def append(self, key, message):
+        await run_in_pool("io", _append_history, key, message, self.keep)
+
+    async def clear(self, key):
+        return await run_in_pool("io", _clear_history, key)
+
+
+def create_history_store(config):
+    if config.get('HISTORY_BACKEND', 'memory') == 'sqlite':
+        return SqliteHistoryStore()
+    return HistoryStore()
@@ -0,0 +1,70 @@
+import asyncio
+import json
+import time
+from bot_utilities.storage import get_connection
+from bot_utilities.executors import run_in_pool
+from bot_utilities.metrics import QUEUE_DEPTH
+
+# SQLite-backed job queue between the gateway process and the workers.
+# Jobs are claimed atomically; a claimed job that is not completed within
+# `visibility_timeout` seconds (e.g. the worker died) becomes claimable again.
+
+# Effective guild settings copied into each job for the worker
+REPLY_JOB_SETTINGS = ('GPT_MODEL', 'LANGUAGE', 'MAX_HISTORY', 'MAX_SEARCH_RESULTS')
+
+
+def _create_table():
+    connection = get_connection()
+    connection.execute('''
+        CREATE TABLE IF NOT EXISTS reply_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            payload TEXT NOT NULL,
+            claimed_by TEXT,
+            claimed_at REAL
+        )
+    ''')
+    connection.commit()
+
+
+def enqueue_job(job):
+    connection = get_connection()
+    with connection:
+        connection.execute('INSERT INTO reply_jobs (payload) VALUES (?)', (json.dumps(job),))
+
+
+def claim_job(worker_id, visibility_timeout=300):
+    """Claims the oldest available job, returns (job ID, job) or None."""
+    now = time.time()
+    connection = get_connection()
+    with connection:
+        row = connection.execute('''
+            UPDATE reply_jobs SET claimed_by = ?, claimed_at = ?
+            WHERE id = (
+                SELECT id FROM reply_jobs
+                WHERE claimed_at IS NULL OR claimed_at < ?
+                ORDER BY id LIMIT 1
+            )
+            RETURNING id, payload
+        ''', (worker_id, now, now - visibility_timeout)).fetchone()
+    if row is None:
+        return None
+    return row[0], json.loads(row[1])
+
+
+def complete_job(job_id):
+    connection = get_connection()
+    with connection:
+        connection.execute('DELETE FROM reply_jobs WHERE id = ?', (job_id,))
+
+
+def count_jobs():
+    return get_connection().execute('SELECT COUNT(*) FROM reply_jobs').fetchone()[0]
+
+
+async def watch_job_queue(interval=5):
+    while True:
+        QUEUE_DEPTH.set(await run_in_pool("io", count_jobs), "reply_jobs")
+        await asyncio.sleep(interval)
+
+
+_create_table()
@@ -0,0 +1,97 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import time
+from bot_utilities.config_loader import config, on_reload
+
+# Attributes every LogRecord has; anything else was passed through `extra`
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Lets through at most `limit` records per `period` seconds for each
+    (logger, level, message template) of WARNING and above. The number of
+    suppressed records is attached to the first record of the next period.
+    """
+
+    def __init__(self, limit=5, period=60):
+        super().__init__()
+        self.limit = limit
+        self.period = period
+        self._windows = {}
+
+    def filter(self, record):
+        if record.levelno < logging.WARNING:
+            return True
+        key = (record.name, record.levelno, record.msg)
+        now = time.monotonic()
+        window = self._windows.get(key)
+        if window is None or now - window[0] >= self.period:
+            if window is not None and window[2]:
+                record.suppressed = window[2]
+            self._windows[key] = [now, 1, 0]
+            return True
+        if window[1] < self.limit:
+            window[1] += 1
+            return True
+        window[2] += 1
+        return False
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        # Formatting happens in the listener thread, not on the event loop
+        return record
+
+
+@on_reload
+def apply_log_levels():
+    logging.getLogger().setLevel(config.get('LOG_LEVEL', 'INFO'))
+    for name, level in (config.get('LOG_LEVELS') or {}).items():
+        logging.getLogger(name).setLevel(level)
+
+
+def setup_logging():
+    """
+    Routes all logging through a queue to a background thread writing to stdout.
+
+    Reads LOG_LEVEL, LOG_LEVELS (per-logger levels), LOG_FORMAT (json/text)
+    and LOG_RATE_LIMIT (repeated warnings/errors per minute) from config.
+    """
+    log_queue = queue.SimpleQueue()
+    queue_handler = _DeferredQueueHandler(log_queue)
+    queue_handler.addFilter(RateLimitFilter(limit=config.get('LOG_RATE_LIMIT', 5)))
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    if config.get('LOG_FORMAT', 'json') == 'json':
+        stream_handler.setFormatter(JsonFormatter())
+    else:
+        stream_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)-8s %(name)s: %(message)s"))
+
+    logging.getLogger().handlers[:] = [queue_handler]
+    apply_log_levels()
+
+    listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
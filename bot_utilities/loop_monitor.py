@@ -0,0 +1,105 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from bot_utilities.metrics import Counter, Gauge, QUEUE_DEPTH
+
+logger = logging.getLogger(__name__)
+
+loop_lag = 0.0
+
+LOOP_LAG = Gauge("bot_event_loop_lag_seconds",
+                 "How late the event loop woke up for the last lag probe",
+                 function=lambda: loop_lag)
+LOOP_STALLS = Counter("bot_event_loop_stalls_total",
+                      "Number of times a callback blocked the event loop longer than the threshold")
+
+
+class BlockingDetector:
+    """
+    Watchdog thread that captures the event loop thread's stack whenever the
+    loop has not ticked for longer than `threshold` seconds.
+
+    Stalls are grouped by the innermost frame from this project, so the same
+    blocking call shows up as one entry with a count and total stall time.
+    """
+
+    def __init__(self, threshold=0.25, interval=0.5):
+        self.threshold = threshold
+        self.interval = interval
+        self.blockers = {}
+        self._lock = threading.Lock()  # `blockers` is written by the watchdog and read on the loop
+        self._loop_thread_id = threading.get_ident()
+        self._last_tick = time.perf_counter()
+        self._stall_key = None
+        self._project_dir = os.path.abspath(os.getcwd())
+
+    def start(self):
+        threading.Thread(target=self._watch, name="loop-watchdog", daemon=True).start()
+
+    def tick(self, lag):
+        """Called from the event loop on every lag probe."""
+        self._last_tick = time.perf_counter()
+        if self._stall_key is not None:
+            with self._lock:
+                self.blockers[self._stall_key][1] += lag
+            self._stall_key = None
+
+    def _watch(self):
+        while True:
+            time.sleep(self.threshold / 2)
+            overdue = time.perf_counter() - self._last_tick - self.interval
+            if overdue > self.threshold and self._stall_key is None:
+                frame = sys._current_frames().get(self._loop_thread_id)
+                if frame is not None:
+                    self._record(traceback.extract_stack(frame))
+
+    def _record(self, stack):
+        own_frames = [entry for entry in stack
+                      if entry.filename.startswith(self._project_dir) and entry.filename != __file__
+                      and "site-packages" not in entry.filename]
+        culprit = own_frames[-1] if own_frames else stack[-1]
+        key = f"{os.path.relpath(culprit.filename, self._project_dir)}:{culprit.lineno} in {culprit.name}"
+        with self._lock:
+            first = key not in self.blockers
+            if first:
+                self.blockers[key] = [0, 0.0, "".join(traceback.format_list(stack))]
+            self.blockers[key][0] += 1
+        if first:
+            logger.warning("Event loop blocked at %s:\n%s", key, self.blockers[key][2],
+                           extra={"blocker": key})
+        self._stall_key = key
+        LOOP_STALLS.inc()
+
+    def top(self, n=10):
+        """Returns the `n` blockers with the highest total stall time as (key, count, seconds)."""
+        with self._lock:
+            blockers = [(key, count, total) for key, (count, total, _) in self.blockers.items()]
+        blockers.sort(key=lambda blocker: blocker[2], reverse=True)
+        return blockers[:n]
+
+
+async def monitor_loop_lag(interval=0.5, detector=None):
+    """Measures how much later than scheduled the loop wakes up a sleeping task."""
+    global loop_lag
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        loop_lag = max(0.0, time.perf_counter() - start - interval)
+        QUEUE_DEPTH.set(len(asyncio.all_tasks()), "event_loop_tasks")
+        if detector is not None:
+            detector.tick(loop_lag)
+
+
+async def report_blockers(detector, interval=600, n=10):
+    """Periodically prints the top blocking call sites."""
+    while True:
+        await asyncio.sleep(interval)
+        if top := detector.top(n):
+            lines = [f"  {total:8.3f}s  {count:5}x  {key}" for key, count, total in top]
+            logger.info("Top event loop blockers:\n%s", "\n".join(lines),
+                        extra={"blockers": [{"site": key, "count": count, "seconds": total}
+                                            for key, count, total in top]})
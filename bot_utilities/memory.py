@@ -0,0 +1,286 @@
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime
+from bot_utilities.archive import DM_GUILD_ID, fetch_messages
+from bot_utilities.config_loader import config
+from bot_utilities.embedding_util import DEFAULT_DIM, FEATURES_VERSION, embed, embed_many, np
+from bot_utilities.executors import run_in_pool
+from bot_utilities.metrics import STAGE_LATENCY
+from bot_utilities.persona_util import estimate_tokens
+from bot_utilities.response_util import split_response
+from bot_utilities.storage import get_connection
+
+logger = logging.getLogger(__name__)
+
+# Long-term memory over the archived `messages` table. Archived messages are
+# split into chunks, embedded in batches and appended to a vector file
+# (<path>.vec, int8 components plus a float32 scale per row, ~4x smaller than
+# float32), with chunk metadata in the local SQLite database. Row lists per
+# user (within one server, or within DMs) and per channel restrict a query to
+# chunks that may be shown where the question was asked, so query cost
+# depends on their history, not on the archive size.
+#
+# Only one process (the only one, or cluster process 0) writes the index;
+# the others follow the rows it commits to SQLite.
+
+CHUNK_LENGTH = 500
+MIN_CHUNK_LENGTH = 15
+
+
+def _create_tables():
+    connection = get_connection()
+    connection.execute('''
+        CREATE TABLE IF NOT EXISTS memory_chunks (
+            row INTEGER PRIMARY KEY,
+            message_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            channel_id INTEGER,
+            guild_id INTEGER,
+            ts REAL NOT NULL,
+            content TEXT NOT NULL
+        )
+    ''')
+    columns = [row[1] for row in connection.execute('PRAGMA table_info(memory_chunks)')]
+    if 'guild_id' not in columns:
+        # Older chunks stay without a guild and are only recalled in their channel
+        connection.execute('ALTER TABLE memory_chunks ADD COLUMN guild_id INTEGER')
+    connection.execute('CREATE TABLE IF NOT EXISTS memory_state (key TEXT PRIMARY KEY, value INTEGER)')
+    connection.commit()
+
+
+def chunk_messages(rows):
+    """Splits archived rows into (message_id, user_id, channel_id, guild_id, ts, text) chunks."""
+    chunks = []
+    for message_id, user_id, channel_id, guild_id, content, ts in rows:
+        for text in split_response(content, CHUNK_LENGTH):
+            if len(text) >= MIN_CHUNK_LENGTH:
+                chunks.append((message_id, user_id, channel_id, guild_id, ts, text))
+    return chunks
+
+
+class MemoryIndex:
+    def __init__(self, path="memory_index", dim=DEFAULT_DIM, writer=True):
+        self.path = path
+        self.vectors_path = f"{path}.vec"
+        self.dim = dim
+        self.writer = writer
+        self.row_type = np.dtype([("vector", np.int8, (dim,)), ("scale", np.float32)])
+        self.size = 0
+        self.last_message_id = 0
+        self.vectors = None
+        self._rows = {}  # ("user", guild_id, user_id) | ("channel", channel_id) -> list of rows
+        self._arrays = {}  # Same keys, rows as arrays, rebuilt when the list grew
+
+    def load(self):
+        """Restores the row lists from SQLite. Blocking, run in the io pool."""
+        _create_tables()
+        connection = get_connection()
+        if self.writer and self._state(connection, 'features') != FEATURES_VERSION:
+            # Vectors of other features don't compare, index the archive again
+            logger.info("Memory index has no vectors of the current features, indexing the archive from the start")
+            with connection:
+                connection.execute('DELETE FROM memory_chunks')
+                connection.execute("REPLACE INTO memory_state (key, value) VALUES ('last_message_id', 0)")
+                connection.execute("REPLACE INTO memory_state (key, value) VALUES ('features', ?)",
+                                   (FEATURES_VERSION,))
+            if os.path.exists(self.vectors_path):
+                os.truncate(self.vectors_path, 0)
+        if self.writer:
+            stored = os.path.getsize(self.vectors_path) // self.row_type.itemsize if os.path.exists(self.vectors_path) else 0
+            # Vectors are written before their metadata, so drop any unmatched tail
+            with connection:
+                connection.execute('DELETE FROM memory_chunks WHERE row >= ?', (stored,))
+        if self._state(connection, 'features') == FEATURES_VERSION:
+            # Otherwise a follower waits for the writer to rebuild the index
+            self._add_rows(self._read_rows(0))
+        if self.writer and stored > self.size:
+            os.truncate(self.vectors_path, self.size * self.row_type.itemsize)
+        self.last_message_id = self._state(connection, 'last_message_id') or 0
+        logger.info("Memory index: %s chunks, archive position %s", self.size, self.last_message_id)
+
+    @staticmethod
+    def _state(connection, key):
+        row = connection.execute('SELECT value FROM memory_state WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    @classmethod
+    def _stored_size(cls):
+        # Chunks of other features count as none until the writer rebuilds them
+        connection = get_connection()
+        if cls._state(connection, 'features') != FEATURES_VERSION:
+            return 0
+        return connection.execute('SELECT coalesce(max(row) + 1, 0) FROM memory_chunks').fetchone()[0]
+
+    @staticmethod
+    def _read_rows(start):
+        return get_connection().execute(
+            'SELECT row, user_id, channel_id, guild_id FROM memory_chunks WHERE row >= ? ORDER BY row',
+            (start,)).fetchall()
+
+    def _add_rows(self, rows):
+        # `rows` are (row, user_id, channel_id, guild_id), continuing from self.size
+        for row, user_id, channel_id, guild_id in rows:
+            if guild_id is not None:
+                self._rows.setdefault(("user", guild_id, user_id), []).append(row)
+            if channel_id is not None:
+                self._rows.setdefault(("channel", channel_id), []).append(row)
+        self.size += len(rows)
+        self.vectors = None
+        if self.size:
+            self.vectors = np.memmap(self.vectors_path, dtype=self.row_type, mode="r", shape=(self.size,))
+
+    def append(self, chunks, vectors, last_message_id):
+        """Stores a batch of chunks and their vectors. Blocking, run in the io pool."""
+        rows = np.zeros(len(vectors), dtype=self.row_type)
+        rows["scale"] = np.abs(vectors).max(axis=1) / 127
+        rows["vector"] = np.round(vectors / np.maximum(rows["scale"], 1e-12)[:, None])
+        with open(self.vectors_path, "ab") as f:
+            rows.tofile(f)
+        connection = get_connection()
+        with connection:
+            connection.executemany(
+                'INSERT INTO memory_chunks (row, message_id, user_id, channel_id, guild_id, ts, content) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                [(self.size + i, *chunk) for i, chunk in enumerate(chunks)])
+            connection.execute("REPLACE INTO memory_state (key, value) VALUES ('last_message_id', ?)",
+                               (last_message_id,))
+
+    def _candidates(self, key):
+        rows = self._rows.get(key, ())
+        array = self._arrays.get(key)
+        if array is None or len(array) != len(rows):
+            array = self._arrays[key] = np.array(rows, dtype=np.int64)
+        return array
+
+    async def update(self, batch_size=1000):
+        """Indexes archived messages newer than the last indexed one."""
+        while True:
+            rows = await run_in_pool("io", fetch_messages, self.last_message_id, batch_size)
+            if not rows:
+                return
+            chunks = chunk_messages(rows)
+            vectors = await run_in_pool("cpu", embed_many, [chunk[5] for chunk in chunks], self.dim)
+            await run_in_pool("io", self.append, chunks, vectors, rows[-1][0])
+            self._add_rows([(self.size + i, user_id, channel_id, guild_id)
+                            for i, (_, user_id, channel_id, guild_id, _, _) in enumerate(chunks)])
+            self.last_message_id = rows[-1][0]
+
+    async def follow(self):
+        """Picks up the chunks the writing process added since the last call."""
+        stored = await run_in_pool("io", self._stored_size)
+        if stored < self.size:
+            # The writer rebuilt the index, start over from its first row
+            self._rows, self._arrays, self.size = {}, {}, 0
+            self.vectors = None
+        if stored > self.size:
+            self._add_rows(await run_in_pool("io", self._read_rows, self.size))
+
+    def search(self, guild_id, user_id, channel_id, query, k=5, min_score=0.3, max_candidates=10000):
+        """
+        Returns up to `k` (score, row) pairs of the user's chunks in the same
+        server (or in DMs) and the channel's chunks most similar to `query`,
+        best first. Only the latest `max_candidates` chunks of each are scored,
+        which bounds the latency for very active users and channels. Blocking,
+        run in the io pool.
+        """
+        # Taken first: rows appended meanwhile may not be mapped yet
+        vectors = self.vectors
+        if vectors is None:
+            return []
+        # Chunks of the user in the channel appear twice, deduplicated below
+        candidates = np.concatenate((self._candidates(("user", guild_id, user_id))[-max_candidates:],
+                                     self._candidates(("channel", channel_id))[-max_candidates:]))
+        candidates = candidates[candidates < len(vectors)]
+        if not len(candidates):
+            return []
+        rows = vectors[candidates]
+        scores = (rows["vector"] @ embed(query, self.dim)) * rows["scale"]
+        if len(scores) > 2 * k:
+            best = np.argpartition(scores, -2 * k)[-2 * k:]
+        else:
+            best = np.arange(len(scores))
+        best = best[np.argsort(scores[best])[::-1]]
+        results = {}
+        for i in best:
+            if scores[i] >= min_score:
+                results.setdefault(int(candidates[i]), float(scores[i]))
+        return [(score, row) for row, score in results.items()][:k]
+
+    def lookup(self, guild_id, user_id, channel_id, query, k=5, min_score=0.3):
+        """
+        Returns the (user_id, ts, content) of the chunks `search` finds, best
+        first. Blocking, run in the io pool.
+        """
+        results = self.search(guild_id, user_id, channel_id, query, k, min_score)
+        if not results:
+            return []
+        rows = {row: (user_id, ts, content) for row, user_id, ts, content in get_connection().execute(
+            f'SELECT row, user_id, ts, content FROM memory_chunks WHERE row IN ({",".join("?" * len(results))})',
+            [row for _, row in results])}
+        return [rows[row] for _, row in results]
+
+    async def recall(self, guild_id, user_id, channel_id, query, k=5, min_score=0.3, token_budget=300):
+        """
+        Formats the chunks most relevant to `query` for the prompt, within
+        `token_budget` estimated tokens. Returns None when nothing relevant
+        is found.
+        """
+        results = await run_in_pool("io", self.lookup, guild_id, user_id, channel_id, query, k, min_score)
+        lines = ["Earlier messages that may be relevant:"]
+        budget = token_budget - estimate_tokens(lines[0])
+        for author_id, ts, content in results:
+            if content == query:
+                continue
+            line = f"- [{datetime.fromtimestamp(ts):%Y-%m-%d}] <@{author_id}>: {content}"
+            budget -= estimate_tokens(line)
+            if budget < 0:
+                break
+            lines.append(line)
+        return "\n".join(lines) if len(lines) > 1 else None
+
+
+def create_memory_index(config):
+    if not config.get('MEMORY', False):
+        return None
+    if np is None:
+        logger.warning("MEMORY is enabled but numpy is not installed, long-term memory disabled")
+        return None
+    return MemoryIndex(path=config.get('MEMORY_PATH', 'memory_index'),
+                       writer=os.getenv("CLUSTER_ID", "0") == "0")
+
+
+memory = create_memory_index(config)
+
+
+async def recall_memory(message):
+    """Returns the prompt section of past messages relevant to `message`, or None."""
+    if memory is None or memory.vectors is None:
+        return None
+    started = time.perf_counter()
+    try:
+        return await memory.recall(message.guild.id if message.guild else DM_GUILD_ID,
+                                   message.author.id, message.channel.id, message.content,
+                                   k=config.get('MEMORY_TOP_K', 5),
+                                   min_score=config.get('MEMORY_MIN_SCORE', 0.3),
+                                   token_budget=config.get('MEMORY_TOKEN_BUDGET', 300))
+    finally:
+        STAGE_LATENCY.observe(time.perf_counter() - started, "memory_recall")
+
+
+async def watch_memory():
+    """
+    Loads the index, then periodically indexes newly archived messages, or
+    picks up the ones the writing process indexed.
+    """
+    await run_in_pool("io", memory.load)
+    while True:
+        try:
+            if memory.writer:
+                await memory.update(config.get('MEMORY_BATCH_SIZE', 1000))
+            else:
+                await memory.follow()
+        except Exception:
+            logger.exception("Failed to update the memory index")
+        await asyncio.sleep(config.get('MEMORY_UPDATE_INTERVAL', 60))
@@ -0,0 +1,167 @@
+import asyncio
+import logging
+import re
+from bot_utilities.archive import fetch_messages, on_archived
+from bot_utilities.config_loader import config
+from bot_utilities.executors import run_in_pool
+from bot_utilities.storage import get_connection
+
+logger = logging.getLogger(__name__)
+
+# Full-text search over the archived chat log. Archived rows are copied into
+# the local SQLite database (`archive`, keyed on the MySQL id) with an FTS5
+# index over their content. New messages are indexed right after they are
+# archived, and a background task pulls rows this process missed (other
+# cluster processes, history from before the index existed) from MySQL.
+
+SNIPPET_TOKENS = 16
+PREVIEW_LENGTH = 200
+
+_live = False  # Set once the tables exist, earlier rows are left to the sync
+
+
+def _create_tables():
+    connection = get_connection()
+    connection.executescript('''
+        CREATE TABLE IF NOT EXISTS archive (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER,
+            channel_id INTEGER,
+            guild_id INTEGER,
+            content TEXT NOT NULL,
+            ts REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS archive_user ON archive (user_id);
+        CREATE INDEX IF NOT EXISTS archive_guild ON archive (guild_id, user_id);
+        CREATE INDEX IF NOT EXISTS archive_ts ON archive (ts);
+        CREATE VIRTUAL TABLE IF NOT EXISTS archive_fts USING fts5(
+            content, content='archive', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+        );
+        CREATE TRIGGER IF NOT EXISTS archive_fts_insert AFTER INSERT ON archive BEGIN
+            INSERT INTO archive_fts (rowid, content) VALUES (new.id, new.content);
+        END;
+        CREATE TABLE IF NOT EXISTS archive_state (key TEXT PRIMARY KEY, value INTEGER);
+    ''')
+    connection.commit()
+
+
+def index_messages(rows):
+    """
+    Adds archived rows (id, user_id, channel_id, guild_id, content, unix time)
+    to the index, skipping the ones already in it. Blocking, run in the io pool.
+    """
+    connection = get_connection()
+    with connection:
+        connection.executemany(
+            'INSERT OR IGNORE INTO archive (id, user_id, channel_id, guild_id, content, ts) VALUES (?, ?, ?, ?, ?, ?)',
+            [row for row in rows if row[4]])
+
+
+@on_archived
+def index_archived(row):
+    if _live:
+        index_messages([row])
+
+
+def _synced_id():
+    row = get_connection().execute("SELECT value FROM archive_state WHERE key = 'synced_id'").fetchone()
+    return row[0] if row else 0
+
+
+def _index_batch(rows):
+    index_messages(rows)
+    connection = get_connection()
+    with connection:
+        connection.execute("REPLACE INTO archive_state (key, value) VALUES ('synced_id', ?)", (rows[-1][0],))
+
+
+async def sync_index(batch_size=5000):
+    """Indexes every archived row after the last synced one, in batches."""
+    synced_id = await run_in_pool("io", _synced_id)
+    while rows := await run_in_pool("io", fetch_messages, synced_id, batch_size):
+        await run_in_pool("io", _index_batch, rows)
+        synced_id = rows[-1][0]
+
+
+async def watch_archive(interval=300):
+    global _live
+    await run_in_pool("io", _create_tables)
+    _live = True
+    while True:
+        try:
+            await sync_index(config.get('MESSAGE_SEARCH_BATCH_SIZE', 5000))
+        except Exception:
+            logger.exception("Failed to sync the message search index")
+        await asyncio.sleep(interval)
+
+
+def _first_id_since(connection, ts):
+    row = connection.execute('SELECT id FROM archive WHERE ts >= ? ORDER BY ts LIMIT 1', (ts,)).fetchone()
+    return row[0] if row else None
+
+
+def _match_query(keywords):
+    # Every word must appear; quoting keeps FTS5 operators and punctuation
+    # typed by users from being parsed as query syntax
+    return " ".join(f'"{word}"' for word in re.findall(r"\w+", keywords))
+
+
+def search_messages(keywords=None, user_id=None, guild_id=None, channel_id=None, after=None, before=None,
+                    limit=10, offset=0):
+    """
+    Searches the archived messages, newest first.
+
+    Args:
+        keywords (str): Words that must all appear, or None to match any message.
+            Keywords without any word characters match nothing.
+        after (float): Only messages sent at or after this unix time.
+        before (float): Only messages sent before this unix time.
+        limit (int): Page size.
+        offset (int): Number of results to skip.
+
+    Returns:
+        list: (message_id, user_id, channel_id, unix time, snippet) tuples. The
+        snippet marks the matched words in bold.
+    """
+    connection = get_connection()
+    # Ids grow with time, so the time range becomes an id range, which both
+    # the indexes and FTS5 can seek to instead of filtering row by row
+    first_id = last_id = None
+    if after is not None and (first_id := _first_id_since(connection, after)) is None:
+        return []
+    if before is not None:
+        last_id = _first_id_since(connection, before)
+    filters, params = [], []
+    for condition, value in (('a.user_id = ?', user_id), ('a.guild_id = ?', guild_id),
+                             ('a.channel_id = ?', channel_id), ('a.id >= ?', first_id), ('a.id < ?', last_id)):
+        if value is not None:
+            filters.append(condition)
+            params.append(value)
+    match = _match_query(keywords) if keywords else ""
+    if keywords and not match:
+        # Nothing searchable (e.g. "!!!"), which would otherwise list everything
+        return []
+    if match:
+        # CROSS JOIN fixes the loop order: a user has few messages, so those
+        # are checked against the match; otherwise the matches are walked
+        # newest first and the LIMIT stops the walk early
+        if user_id is not None:
+            source, order = "archive a CROSS JOIN archive_fts ON archive_fts.rowid = a.id", "a.id"
+        else:
+            source, order = "archive_fts CROSS JOIN archive a ON a.id = archive_fts.rowid", "archive_fts.rowid"
+            filters = [f.replace("a.id", "archive_fts.rowid") for f in filters]
+        query = f'''
+            SELECT a.id, a.user_id, a.channel_id, a.ts,
+                   snippet(archive_fts, 0, '**', '**', '…', {SNIPPET_TOKENS})
+            FROM {source}
+            WHERE archive_fts MATCH ? {"".join(f" AND {f}" for f in filters)}
+            ORDER BY {order} DESC LIMIT ? OFFSET ?
+        '''
+        params.insert(0, match)
+    else:
+        query = f'''
+            SELECT a.id, a.user_id, a.channel_id, a.ts, substr(a.content, 1, {PREVIEW_LENGTH})
+            FROM archive a {"WHERE " + " AND ".join(filters) if filters else ""}
+            ORDER BY a.id DESC LIMIT ? OFFSET ?
+        '''
+    return connection.execute(query, (*params, limit, offset)).fetchall()
@@ -0,0 +1,143 @@
+import os
+import resource
+import time
+from bisect import bisect_left
+
+# Lightweight in-process metrics registry rendered in the Prometheus text
+# format. Observations are plain dict/list updates, no locks or allocations
+# beyond the first use of a label combination.
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+registry = []
+
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = [*zip(labelnames, values), *extra]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in pairs) + "}"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values = {}
+        registry.append(self)
+
+    def inc(self, *labels, amount=1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def get(self, *labels):
+        return self._values.get(labels, 0)
+
+    def collect(self):
+        for labels, value in self._values.items():
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {value}"
+
+
+class Gauge:
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(), function=None):
+        """
+        Args:
+            function (callable): Optional callback evaluated on every scrape.
+                It returns a number, or a dict of label tuple -> number.
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.function = function
+        self._values = {}
+        registry.append(self)
+
+    def set(self, value, *labels):
+        self._values[labels] = value
+
+    def collect(self):
+        values = self._values
+        if self.function is not None:
+            result = self.function()
+            values = result if isinstance(result, dict) else {(): result}
+        for labels, value in values.items():
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {value}"
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self._values = {}
+        registry.append(self)
+
+    def observe(self, value, *labels):
+        if (state := self._values.get(labels)) is None:
+            # Per-bucket counts (+Inf last) and the sum of observations
+            state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        state[0][bisect_left(self.buckets, value)] += 1
+        state[1] += value
+
+    def time(self, *labels):
+        return _Timer(self, labels)
+
+    def collect(self):
+        for labels, (counts, total) in self._values.items():
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, labels, (('le', bound),))} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, labels)} {total}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}"
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "start")
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labels)
+
+
+def render():
+    lines = []
+    for metric in registry:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.collect())
+    return "\n".join(lines) + "\n"
+
+
+def get_rss():
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        # Peak RSS (in KiB on Linux) where /proc is not available
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+STAGE_LATENCY = Histogram("bot_stage_latency_seconds",
+                          "Latency of each reply pipeline stage", ("stage",))
+CACHE_REQUESTS = Counter("bot_cache_requests_total",
+                         "Cache lookups by cache and result (hit/miss)", ("cache", "result"))
+UPSTREAM_REQUESTS = Counter("bot_upstream_requests_total",
+                            "Requests to upstream services by result (ok/error)", ("upstream", "result"))
+QUEUE_DEPTH = Gauge("bot_queue_depth", "Number of pending items per queue", ("queue",))
+RSS = Gauge("bot_process_resident_memory_bytes", "Resident memory size of the bot process",
+            function=get_rss)
@@ -0,0 +1,86 @@
+import asyncio
+import os
+import sys
+import time
+import tracemalloc
+from collections import Counter
+from bot_utilities.executors import run_in_pool
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+def sample_stacks(thread_id, seconds, interval=0.005):
+    """
+    Samples the stack of another thread for `seconds`.
+
+    Must run in a different thread than the one being sampled. The cost for
+    the sampled thread is only the GIL hand-off at each sample.
+
+    Returns:
+        Counter: Collapsed stack ("outer;...;inner") -> number of samples.
+    """
+    stacks = Counter()
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        frame = sys._current_frames().get(thread_id)
+        labels = []
+        while frame is not None:
+            labels.append(_frame_label(frame))
+            frame = frame.f_back
+        if labels:
+            stacks[";".join(reversed(labels))] += 1
+        time.sleep(interval)
+    return stacks
+
+
+def format_collapsed(stacks):
+    """Formats samples in the collapsed-stack format read by flamegraph.pl and speedscope."""
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+def format_top(stacks, n=25):
+    total = sum(stacks.values()) or 1
+    own = Counter()
+    inclusive = Counter()
+    for stack, count in stacks.items():
+        labels = stack.split(";")
+        own[labels[-1]] += count
+        for label in set(labels):
+            inclusive[label] += count
+    lines = [f"{total} samples", "", f"{'self %':>8}{'total %':>9}  function"]
+    for label, count in own.most_common(n):
+        lines.append(f"{100 * count / total:>7.1f}%{100 * inclusive[label] / total:>8.1f}%  {label}")
+    return "\n".join(lines) + "\n"
+
+
+def _format_growth(before, after, seconds, n):
+    current, peak = tracemalloc.get_traced_memory()
+    stats = after.compare_to(before, 'lineno')
+    lines = [f"Top {n} allocation sites by growth over {seconds}s", ""]
+    lines.extend(str(stat) for stat in stats[:n])
+    lines.append(f"\nTraced memory: {current / 1024 / 1024:.1f} MB (peak {peak / 1024 / 1024:.1f} MB)")
+    return "\n".join(lines) + "\n"
+
+
+async def memory_profile(seconds, n=25):
+    """
+    Diffs two tracemalloc snapshots taken `seconds` apart. Snapshots and the
+    diff walk the whole heap, so they run in the io pool.
+
+    Returns:
+        str: The top `n` allocation sites by size growth.
+    """
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start(10)
+    try:
+        before = await run_in_pool("io", tracemalloc.take_snapshot)
+        await asyncio.sleep(seconds)
+        after = await run_in_pool("io", tracemalloc.take_snapshot)
+        return await run_in_pool("io", _format_growth, before, after, seconds, n)
+    finally:
+        if started:
+            tracemalloc.stop()
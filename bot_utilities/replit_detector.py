@@ -1,8 +1,21 @@
+import logging
 import os
 
+logger = logging.getLogger(__name__)
+
+Welcomer = """⚠️ Look on Rebot to keep_alive!
+Please note that the .env file cannot exist on (Replit).
+Instead, create environment variable DISCORD_TOKEN in the "Secrets"."""
+
 def detect_replit():
     return "REPL_OWNER" in os.environ
 
+def print_replit_welcome():
+    logger.warning(Welcomer)
+    repl_owner_name = os.environ.get('REPL_OWNER')
+    repl_project_name = os.environ.get('REPL_SLUG')
+    logger.info("Hier is link to Rebot URL: https://%s.%s.repl.co", repl_project_name, repl_owner_name)
+
 if __name__ == "__main__":
     if detect_replit():
-        print("We are running on replit")
\ No newline at end of file
+        print("We are running on replit")
@@ -0,0 +1,158 @@
+import logging
+import discord
+from bot_utilities.ai_utils import generate_response, search
+from bot_utilities.config_loader import config, instructions
+from bot_utilities.dedup import DUPLICATE_MESSAGES, duplicates
+from bot_utilities.executors import run_in_pool
+from bot_utilities.job_queue import REPLY_JOB_SETTINGS
+from bot_utilities.metrics import STAGE_LATENCY, UPSTREAM_REQUESTS
+from bot_utilities.persona_util import estimate_tokens, get_persona_prompt
+from bot_utilities.response_cache import response_cache
+from bot_utilities.semantic_cache import semantic_cache
+from bot_utilities.response_util import build_delivery
+from bot_utilities.send_queue import dispatcher
+from bot_utilities.tracing import span
+
+logger = logging.getLogger(__name__)
+
+DELIVERY_ERROR = "I apologize for any inconvenience caused. It seems that there was an error preventing the delivery of my message. Additionally, it appears that the message I was replying to has been deleted, which could be the reason for the issue. If you have any further questions or if there's anything else I can assist you with, please let me know and I'll be happy to help."
+GENERATION_ERROR = "I apologize for any inconvenience caused. It seems that there was an error preventing the delivery of my message."
+
+
+def _fit_history(history, budget):
+    # Newest messages first, so the oldest ones are dropped when over budget
+    kept = []
+    for message in reversed(history):
+        budget -= estimate_tokens(message.get("content") or "")
+        if budget < 0:
+            break
+        kept.append(message)
+    return kept[::-1]
+
+
+async def _generate(target, channel, bot_user, *, content, context, prompt, persona, settings, history, duplicate):
+    # Cosmetic: skipped by the dispatcher when the channel is busy
+    search_reaction = None
+    if config['INTERNET_ACCESS']:
+        search_reaction = dispatcher.submit(channel.id, lambda: target.add_reaction("🔎"), essential=False)
+
+    async def generate():
+        with STAGE_LATENCY.time("search"), span("search"):
+            search_results = await search(content, max_results=settings['MAX_SEARCH_RESULTS'])
+        with STAGE_LATENCY.time("llm"), span("generate_response", model=settings['GPT_MODEL']):
+            return await generate_response(instructions=prompt,
+                                           search=search_results,
+                                           history=history,
+                                           context=context,
+                                           model=settings['GPT_MODEL'])
+
+    # The context only adds the time and the asker's name, so copies with the
+    # same persona and settings get the same answer
+    share_key = (persona, config['INTERNET_ACCESS'], *(settings[key] for key in REPLY_JOB_SETTINGS))
+    async with channel.typing():
+        # Identical messages within DEDUP_WINDOW share one search and generation
+        response = await duplicates.share(duplicate, share_key, generate)
+        if search_reaction is not None:
+            if not search_reaction.done():
+                search_reaction.cancel()
+            elif search_reaction.result():
+                dispatcher.submit(channel.id, lambda: target.remove_reaction("🔎", bot_user), essential=False)
+    return response
+
+
+async def answer(target, channel, bot_user, *, content, context, persona, settings, history_store, key,
+                 guild_id=None, memory=None, cache=False):
+    """
+    Runs search and the LLM for a message and replies with the answer.
+
+    Works both with full gateway objects and with partial ones built from IDs
+    (worker mode), so only REST calls are made on `target` and `channel`.
+
+    Args:
+        target: Message or PartialMessage being answered.
+        channel: Messageable the message was sent in.
+        bot_user: The bot's own user, used to remove the search reaction.
+        content (str): Message content after mention rewriting.
+        context (str): Dynamic context (time, user status).
+        persona (str): Persona name.
+        settings (dict): Effective settings for the guild.
+        history_store: HistoryStore holding the conversation.
+        key (str): Conversation key ("<user id>-<channel id>").
+        guild_id (int): Guild the message was sent in, None for DMs. Cached
+            answers are only reused within the same guild (or DMs).
+        memory (str): Recalled earlier messages for the prompt, or None.
+            Answers using them are tailored to the asker and never cached
+            or shared.
+        cache (bool): Whether the channel opted in to the response cache.
+    """
+    # Raids post the same text in many channels at once
+    duplicate = duplicates.record(content, ("guild", guild_id) if guild_id is not None else ("dm", channel.id),
+                                  channel.id)
+    dedup_action = config.get('DEDUP_ACTION', 'off')
+    if duplicate is not None and duplicate.hits > 1 and dedup_action == 'drop':
+        DUPLICATE_MESSAGES.inc("dropped")
+        return
+
+    internet_access = config['INTERNET_ACCESS']
+    prompt, prompt_tokens = get_persona_prompt(instructions, persona, internet_access)
+
+    history = await history_store.load(key, settings['MAX_HISTORY'])
+    # An answer depends on its author's history and recalled memory, so only
+    # copies without either share one
+    if history or memory or dedup_action != 'share':
+        duplicate = None
+    if memory:
+        context += "\n\n" + memory
+
+    # Only questions asked outside a conversation can be answered from the cache
+    cache_key = response = None
+    if cache and not history and not memory:
+        cache_key = response_cache.key(guild_id, persona, content,
+                                       settings['GPT_MODEL'], settings['LANGUAGE'], internet_access)
+        response = response_cache.get(cache_key)
+        # Paraphrases of a cached question
+        semantic_scope = f"{guild_id}:{persona}:{cache_key[3].hex()}"
+        if response is None and semantic_cache is not None:
+            response = await run_in_pool("io", semantic_cache.get, semantic_scope, content)
+
+    user_message = {"role": "user", "content": content}
+    await history_store.append(key, user_message)
+
+    if response is None:
+        # The persona prompt, context and question are always sent, history
+        # only fills what is left of PROMPT_TOKEN_BUDGET
+        budget = (config.get('PROMPT_TOKEN_BUDGET', 3000) - prompt_tokens - estimate_tokens(context)
+                  - estimate_tokens(content))
+        response = await _generate(target, channel, bot_user, content=content, context=context, prompt=prompt,
+                                   persona=persona, settings=settings,
+                                   history=[*_fit_history(history, budget), user_message], duplicate=duplicate)
+        # An empty answer has no chunks to send, so it is reported like a failure
+        if response is not None and not response.strip():
+            response = None
+        if cache_key is not None and response is not None:
+            response_cache.put(cache_key, response)
+            if semantic_cache is not None:
+                await run_in_pool("io", semantic_cache.put, semantic_scope, content, response)
+
+    await history_store.append(key, {
+        "role": "assistant",
+        "name": config['INSTRUCTIONS'].title(),
+        "content": response
+    })
+
+    if response is not None:
+        with span("build_delivery") as delivery_span:
+            strategy, payloads = build_delivery(response)
+            delivery_span.set_attribute("strategy", strategy)
+        for payload in payloads:
+            try:
+                with STAGE_LATENCY.time("discord_send"), span("message.reply", strategy=strategy):
+                    await dispatcher.submit(channel.id, lambda payload=payload: target.reply(
+                        allowed_mentions=discord.AllowedMentions.none(), **payload))
+                UPSTREAM_REQUESTS.inc("discord", "ok")
+            except discord.HTTPException:
+                UPSTREAM_REQUESTS.inc("discord", "error")
+                logger.warning("Failed to deliver a reply", exc_info=True)
+                await dispatcher.submit(channel.id, lambda: channel.send(DELIVERY_ERROR))
+    else:
+        await dispatcher.submit(channel.id, lambda: target.reply(GENERATION_ERROR))
@@ -0,0 +1,67 @@
+import sys
+import time
+from collections import OrderedDict
+
+
+class ReplyTracker:
+    """
+    Bounded mapping of user message ID -> IDs of the bot replies to it.
+
+    Entries are kept in insertion order, so both size and TTL eviction only
+    ever touch the oldest entry (O(1) per evicted entry).
+    """
+
+    def __init__(self, max_size=10000, ttl=86400):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, message_id, reply_id):
+        now = time.monotonic()
+        if (entry := self._entries.get(message_id)) is not None:
+            # Another chunk of the same answer
+            entry[1].append(reply_id)
+            self._entries.move_to_end(message_id)
+            self._entries[message_id] = (now, entry[1])
+        else:
+            self._entries[message_id] = (now, [reply_id])
+        self._expire(now)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def pop(self, message_id):
+        """Removes and returns the reply IDs for a message, or None."""
+        self._expire(time.monotonic())
+        if (entry := self._entries.pop(message_id, None)) is not None:
+            return entry[1]
+        return None
+
+    def _expire(self, now):
+        deadline = now - self.ttl
+        while self._entries:
+            oldest = next(iter(self._entries.values()))
+            if oldest[0] >= deadline:
+                break
+            self._entries.popitem(last=False)
+
+    def estimate_memory(self, entries=None):
+        """
+        Estimates the memory used by the tracker in bytes.
+
+        Args:
+            entries (int): Number of entries to estimate for, defaults to the current size.
+        """
+        if entries is None:
+            entries = len(self._entries)
+        sample_id = 1 << 60  # Snowflakes are 64-bit ints
+        per_entry = (sys.getsizeof(sample_id) * 2 + sys.getsizeof((0.0, [])) + sys.getsizeof(0.0)
+                     + sys.getsizeof([sample_id]) + 100)  # ~100 bytes of OrderedDict bookkeeping
+        return sys.getsizeof(OrderedDict()) + entries * per_entry
+
+
+def create_reply_tracker(config):
+    return ReplyTracker(max_size=config.get('MAX_TRACKED_REPLIES', 10000),
+                        ttl=config.get('TRACKED_REPLY_TTL', 86400))
@@ -0,0 +1,62 @@
+import hashlib
+import time
+from collections import OrderedDict
+from bot_utilities.config_loader import config, on_reload
+from bot_utilities.dedup import fingerprint
+from bot_utilities.metrics import CACHE_REQUESTS
+
+
+class ResponseCache:
+    """
+    LRU cache of answers to context-free questions, keyed on (guild,
+    persona, normalized prompt, short hash of the generation settings).
+    Answers never cross guilds, nor go from a guild to DMs.
+
+    Entries expire `ttl` seconds after they were stored. Hits move an entry
+    to the end, so eviction always pops the least recently used one.
+    """
+
+    def __init__(self, max_size=1000, ttl=3600):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def key(guild_id, persona, prompt, *context):
+        context_hash = hashlib.blake2b(repr(context).encode(), digest_size=4).digest()
+        return guild_id, persona, fingerprint(prompt)[0], context_hash
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            CACHE_REQUESTS.inc("response", "miss")
+            return None
+        self._entries.move_to_end(key)
+        CACHE_REQUESTS.inc("response", "hit")
+        return entry[1]
+
+    def put(self, key, response):
+        self._entries[key] = (time.monotonic() + self.ttl, response)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+
+response_cache = ResponseCache(max_size=config.get('RESPONSE_CACHE_SIZE', 1000),
+                               ttl=config.get('RESPONSE_CACHE_TTL', 3600))
+
+
+@on_reload
+def configure_response_cache():
+    # Personas or prompts may have changed, so cached answers are stale
+    response_cache.max_size = config.get('RESPONSE_CACHE_SIZE', 1000)
+    response_cache.ttl = config.get('RESPONSE_CACHE_TTL', 3600)
+    response_cache.clear()
@@ -1,7 +1,10 @@
+import io
 import re
 import random
 import aiohttp
+import discord
 from langdetect import detect
+from bot_utilities.config_loader import config
 
 async def replace_with_image_url(response):
     if match := re.search(r'<draw:(.*?)>', response):
@@ -28,24 +31,156 @@ async def get_random_image_url(query):
                 return random.choice(original_urls)
     return None
 
+# Opening/closing line of a fenced code block
+_FENCE = re.compile(r'^\s*(```|~~~)')
+# Same, anchored at the `pos` given to match() (`^` only matches at index 0)
+_FENCE_AT = re.compile(r'\s*(```|~~~)')
+_SPACES = re.compile(r' *')
+
+
+class ResponseSplitter:
+    """
+    Splits text into Discord-sized chunks in a single pass.
+
+    Lines are buffered in a list and joined once per chunk. Chunks break at
+    line boundaries, or at the last space of an overlong line so words and
+    URLs stay intact. A code block cut across chunks is closed at the end of
+    one chunk and reopened (with its language) at the start of the next.
+    `feed()` accepts arbitrary pieces of text, so streamed output can be
+    split as it arrives.
+    """
+
+    def __init__(self, max_length=1999):
+        self.max_length = max_length
+        self._parts = []
+        self._length = 0
+        self._has_content = False
+        self._fence = None  # Opening line of the current code block
+        self._pending = []  # Text after the last newline seen by feed()
+        self._chunks = []
+
+    def feed(self, text):
+        """Adds text and returns the chunks completed by it."""
+        if "\n" not in text:
+            self._pending.append(text)
+            return []
+        lines = text.split("\n")
+        self._pending.append(lines[0])
+        lines[0] = "".join(self._pending)
+        self._pending = [lines.pop()]
+        for line in lines:
+            self._add_line(line)
+        return self._take()
+
+    def flush(self):
+        """Returns the remaining chunks and resets the splitter."""
+        if self._pending:
+            self._add_line("".join(self._pending))
+            self._pending = []
+        self._emit()
+        self._fence = None
+        self._parts = []
+        self._length = 0
+        return self._take()
+
+    def _take(self):
+        chunks, self._chunks = self._chunks, []
+        return chunks
+
+    def _closing(self, fence):
+        return "\n" + _FENCE.match(fence).group(1) if fence else ""
+
+    def _add_line(self, line):
+        fence = self._fence
+        if _FENCE.match(line):
+            if fence is None:
+                fence = line.strip()
+            elif line.strip() == _FENCE.match(fence).group(1):
+                fence = None
+        # Room for closing the code block this line leaves open
+        reserve = len(self._closing(fence))
+
+        if self._length + len(line) + 1 + reserve > self.max_length:
+            self._emit()
+            self._fence = fence
+            # Pieces are cut from a moving start index; slicing the rest of
+            # the line after every cut would make very long lines quadratic
+            start = 0
+            while len(line) - start > (available := self.max_length - self._length - 1 - reserve):
+                cut = line.rfind(" ", start, start + available + 1)
+                while cut > start and self._breaks_fence(line, start, cut):
+                    cut = line.rfind(" ", start, cut)
+                if cut <= start:
+                    cut = start + available
+                    while cut > start + 1 and self._breaks_fence(line, start, cut):
+                        cut -= 1
+                self._append(line[start:cut])
+                self._emit()
+                start = _SPACES.match(line, cut).end()
+            line = line[start:]
+        self._append(line)
+        self._fence = fence
+
+    @staticmethod
+    def _breaks_fence(line, start, cut):
+        # Neither piece of a split line may read as a code fence on its own
+        return bool(_FENCE_AT.match(line, cut)) or line[start:cut].strip() in ("```", "~~~")
+
+    def _append(self, line):
+        if self._parts:
+            self._parts.append("\n")
+            self._length += 1
+        self._parts.append(line)
+        self._length += len(line)
+        self._has_content = self._has_content or bool(line.strip())
+
+    def _emit(self):
+        if self._has_content:
+            chunk = "".join(self._parts).strip()
+            self._chunks.append(chunk + self._closing(self._fence))
+        # The next chunk reopens the code block this one closed
+        reopen = self._fence or ""
+        if len(reopen) > self.max_length // 4:
+            reopen = _FENCE.match(reopen).group(1)
+        self._parts = [reopen] if reopen else []
+        self._length = len(reopen)
+        self._has_content = False
+
+
 def split_response(response, max_length=1999):
-    lines = response.splitlines()
-    chunks = []
-    current_chunk = ""
+    splitter = ResponseSplitter(max_length)
+    return splitter.feed(response) + splitter.flush()
 
-    for line in lines:
-        if len(current_chunk) + len(line) + 1 > max_length:
-            chunks.append(current_chunk.strip())
-            current_chunk = line
-        else:
-            if current_chunk:
-                current_chunk += "\n"
-            current_chunk += line
+def build_delivery(response):
+    """
+    Picks how to deliver an answer: plain chunks, one embed or a Markdown attachment.
 
-    if current_chunk:
-        chunks.append(current_chunk.strip())
+    Args:
+        response (str): The answer.
 
-    return chunks
+    Returns:
+        tuple: (strategy, payloads) where each payload is the keyword arguments
+        for one `send`/`reply` call.
+    """
+    chunks = split_response(response)
+    if config.get('DELIVERY_MODE', 'auto') == 'chunks' or len(chunks) <= 1:
+        return "chunks", [{"content": chunk, "suppress_embeds": True} for chunk in chunks]
+
+    if len(response) <= config.get('EMBED_MAX_LENGTH', 4096):
+        return "embed", [{"embed": discord.Embed(description=response, color=0x03a64b)}]
+
+    if len(chunks) > config.get('ATTACHMENT_MIN_CHUNKS', 3):
+        preview_length = config.get('ATTACHMENT_PREVIEW_LENGTH', 300)
+        preview = response
+        if len(response) > preview_length:
+            preview = response[:preview_length]
+            # Cut at the last whitespace; a whitespace-only prefix has no words to split
+            if preview.strip():
+                preview = preview.rsplit(None, 1)[0]
+        file = discord.File(io.BytesIO(response.encode()), filename="answer.md")
+        return "attachment", [{"content": f"{preview}…", "file": file, "suppress_embeds": True}]
+
+    return "chunks", [{"content": chunk, "suppress_embeds": True} for chunk in chunks]
 
 async def translate_to_en(text):
     detected_lang = detect(text)
@@ -82,4 +217,16 @@ async def get_random_prompt(prompt):
             response_json = await response.json()
             prompts = response_json['prompts']
             random_prompt = random.choice(prompts)
-            return random_prompt['prompt']
\ No newline at end of file
+            return random_prompt['prompt']
+
+
+if __name__ == "__main__":
+    # Microbenchmark: split a ~100 KB answer mixing prose, long URLs and code blocks
+    import timeit
+    paragraph = " ".join(["lorem ipsum dolor sit amet"] * 40 + ["https://example.com/" + "a" * 120]) + "\n\n"
+    code = "```python\n" + "print('hello world')\n" * 60 + "```\n\n"
+    text = ((paragraph + code) * 60)[:100_000]
+    runs = 50
+    seconds = timeit.timeit(lambda: split_response(text), number=runs)
+    chunks = split_response(text)
+    print(f"{len(text)} chars -> {len(chunks)} chunks, {seconds / runs * 1000:.2f} ms per split")
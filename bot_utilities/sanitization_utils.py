@@ -9,4 +9,39 @@ def sanitize_username(name):
     return name
 
 def sanitize_prompt(input_string):
-    return re.sub(r'[^\w\s]', '', input_string)
\ No newline at end of file
+    return re.sub(r'[^\w\s]', '', input_string)
+
+# <@id>, <@!id>, <@&id>, <#id> and <:name:id>/<a:name:id> custom emoji
+_MENTION_PATTERN = re.compile(r'<(@!?|@&|#)(\d+)>|<a?(:\w+:)\d+>')
+
+
+def normalize_mentions(message):
+    """
+    Rewrites mentions and custom emoji in a message's content into plain text
+    in a single regex pass.
+
+    Users become their display name, roles "@role", channels "#channel" and
+    custom emoji ":name:". Mentions that cannot be resolved are left as-is.
+
+    Returns:
+        str: The rewritten content.
+    """
+    content = message.content
+    if '<' not in content:
+        return content
+
+    names = {}
+    for user in message.mentions:
+        names['@', user.id] = user.display_name
+    for role in message.role_mentions:
+        names['@&', role.id] = f'@{role.name}'
+    for channel in message.channel_mentions:
+        names['#', channel.id] = f'#{channel.name}'
+
+    def replace(match):
+        if match.group(3):
+            return match.group(3)
+        kind = '@' if match.group(1) == '@!' else match.group(1)
+        return names.get((kind, int(match.group(2))), match.group(0))
+
+    return _MENTION_PATTERN.sub(replace, content)
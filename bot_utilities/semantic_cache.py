@@ -0,0 +1,246 @@
+import asyncio
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from bot_utilities.config_loader import config, on_reload
+from bot_utilities.embedding_util import DEFAULT_DIM, FEATURES_VERSION, embed, np
+from bot_utilities.executors import run_in_pool
+from bot_utilities.metrics import CACHE_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+
+class SemanticCache:
+    """
+    Answers to previous questions, looked up by embedding similarity.
+
+    Question vectors are rows of one float32 matrix (optionally a memory-mapped
+    .npy file), so a lookup is a single matrix-vector product. Rows only match
+    questions of the same scope (guild, persona and generation settings).
+    Expired rows are skipped, and once the matrix is full new answers
+    overwrite expired rows first, then the least recently used one.
+
+    Lookups and inserts touch the whole matrix (memory-mapped pages
+    included), so callers run them in the io pool; a lock keeps concurrent
+    calls consistent.
+    """
+
+    def __init__(self, max_size=5000, threshold=0.95, ttl=86400, dim=DEFAULT_DIM, path=None, memmap=False):
+        self.max_size = max_size
+        self.threshold = threshold
+        self.ttl = ttl
+        self.dim = dim
+        self.path = path
+        self.size = 0
+        self._stale = False
+        if path and memmap:
+            self.vectors = self._open_memmap(f"{path}.npy")
+        else:
+            self.vectors = np.zeros((max_size, dim), dtype=np.float32)
+        self.memmap = path is not None and memmap
+        self.scopes = np.full(max_size, -1, dtype=np.int32)
+        self.expires = np.zeros(max_size)
+        self.used = np.zeros(max_size)
+        self.questions = [None] * max_size
+        self.responses = [None] * max_size
+        self._scope_ids = {}
+        self._lock = threading.Lock()
+        if path and os.path.exists(f"{path}.json") and not self._stale:
+            self.load()
+
+    def _open_memmap(self, vectors_path):
+        if os.path.exists(vectors_path):
+            vectors = np.load(vectors_path, mmap_mode="r+")
+            if vectors.shape == (self.max_size, self.dim):
+                return vectors
+            logger.warning("Semantic cache size or dimension changed, starting empty")
+        # A new file has no vectors for the saved rows
+        self._stale = True
+        return np.lib.format.open_memmap(vectors_path, mode="w+", dtype=np.float32,
+                                         shape=(self.max_size, self.dim))
+
+    def get(self, scope, question):
+        """Returns the answer to the most similar cached question, or None. Blocking."""
+        query = embed(question, self.dim)
+        with self._lock:
+            return self._get(scope, query)
+
+    def _get(self, scope, query):
+        scope_id = self._scope_ids.get(scope)
+        if scope_id is None or not self.size:
+            CACHE_REQUESTS.inc("semantic_response", "miss")
+            return None
+        now = time.time()
+        scores = self.vectors[:self.size] @ query
+        valid = (self.scopes[:self.size] == scope_id) & (self.expires[:self.size] > now)
+        scores = np.where(valid, scores, -1)
+        row = int(scores.argmax())
+        if scores[row] < self.threshold:
+            CACHE_REQUESTS.inc("semantic_response", "miss")
+            return None
+        self.used[row] = now
+        CACHE_REQUESTS.inc("semantic_response", "hit")
+        return self.responses[row]
+
+    def put(self, scope, question, response):
+        """Stores an answer. Blocking."""
+        vector = embed(question, self.dim)
+        with self._lock:
+            self._put(scope, question, vector, response)
+
+    def _put(self, scope, question, vector, response):
+        now = time.time()
+        if self.size < self.max_size:
+            row = self.size
+            self.size += 1
+        else:
+            # Expired rows sort first, then the least recently used
+            row = int(np.where(self.expires > now, self.used, -1).argmin())
+        self.vectors[row] = vector
+        self.scopes[row] = self._scope_ids.setdefault(scope, len(self._scope_ids))
+        self.expires[row] = now + self.ttl
+        self.used[row] = now
+        self.questions[row] = question
+        self.responses[row] = response
+
+    def clear(self):
+        with self._lock:
+            self.size = 0
+            self._scope_ids.clear()
+
+    def snapshot(self):
+        """Copies the cache state for `save()`."""
+        with self._lock:
+            rows = [
+                [int(self.scopes[row]), float(self.expires[row]), float(self.used[row]),
+                 self.questions[row], self.responses[row]]
+                for row in range(self.size)
+            ]
+            vectors = None if self.memmap else self.vectors[:self.size].copy()
+            scopes = list(self._scope_ids)
+        return {"dim": self.dim, "features": FEATURES_VERSION, "scopes": scopes, "rows": rows}, vectors
+
+    def save(self, snapshot=None):
+        """Writes the cache next to `path` (<path>.json and <path>.npy)."""
+        metadata, vectors = snapshot or self.snapshot()
+        if self.memmap:
+            self.vectors.flush()
+        else:
+            with open(f"{self.path}.npy.tmp", "wb") as f:
+                np.save(f, vectors, allow_pickle=False)
+            os.replace(f"{self.path}.npy.tmp", f"{self.path}.npy")
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding='utf-8') as f:
+            json.dump(metadata, f)
+        os.replace(tmp_path, f"{self.path}.json")
+
+    def load(self):
+        """
+        Restores a saved cache. A missing, unreadable or mismatched file
+        (other dimension or features, fewer vectors than rows) is logged and
+        the cache starts empty, to be rebuilt from new answers.
+        """
+        try:
+            with open(f"{self.path}.json", encoding='utf-8') as f:
+                metadata = json.load(f)
+            rows = metadata["rows"][:self.max_size]
+            if metadata["dim"] != self.dim or metadata.get("features") != FEATURES_VERSION:
+                raise ValueError("dimension or features changed")
+            if not self.memmap:
+                vectors = np.load(f"{self.path}.npy")
+                if vectors.ndim != 2 or vectors.shape[0] < len(rows) or vectors.shape[1] != self.dim:
+                    raise ValueError(f"{vectors.shape[0]} vectors for {len(rows)} rows")
+                self.vectors[:len(rows)] = vectors[:len(rows)]
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning("Could not load the semantic cache from %s (%s), starting empty", self.path, e)
+            return
+        self._scope_ids = {scope: scope_id for scope_id, scope in enumerate(metadata["scopes"])}
+        for row, (scope_id, expires, used, question, response) in enumerate(rows):
+            self.scopes[row] = scope_id
+            self.expires[row] = expires
+            self.used[row] = used
+            self.questions[row] = question
+            self.responses[row] = response
+        self.size = len(rows)
+        logger.info("Loaded %s cached answers from %s", self.size, self.path)
+
+
+def create_semantic_cache(config):
+    if not config.get('SEMANTIC_CACHE', False):
+        return None
+    if np is None:
+        logger.warning("SEMANTIC_CACHE is enabled but numpy is not installed, semantic cache disabled")
+        return None
+    return SemanticCache(max_size=config.get('SEMANTIC_CACHE_SIZE', 5000),
+                         threshold=config.get('SEMANTIC_CACHE_THRESHOLD', 0.95),
+                         ttl=config.get('SEMANTIC_CACHE_TTL', 86400),
+                         path=config.get('SEMANTIC_CACHE_PATH') or None,
+                         memmap=config.get('SEMANTIC_CACHE_MEMMAP', False))
+
+
+semantic_cache = create_semantic_cache(config)
+
+
+@on_reload
+def configure_semantic_cache():
+    if semantic_cache is not None:
+        # Size, path and memmap take effect on restart
+        semantic_cache.threshold = config.get('SEMANTIC_CACHE_THRESHOLD', 0.95)
+        semantic_cache.ttl = config.get('SEMANTIC_CACHE_TTL', 86400)
+        semantic_cache.clear()
+
+
+async def persist_semantic_cache(interval=300):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await run_in_pool("io", semantic_cache.save)
+        except Exception:
+            logger.exception("Failed to save the semantic cache")
+
+
+def benchmark(path, thresholds=(0.6, 0.7, 0.75, 0.8, 0.85, 0.9, 0.95, 0.97)):
+    """
+    Replays a recorded question set through the cache and prints precision
+    and recall per threshold.
+
+    The file has one JSON object per line: {"text": ..., "group": ...}, where
+    questions asking the same thing share a group. A hit is correct when the
+    cached answer came from a question of the same group; a miss is wrong
+    when a question of its group was already cached.
+    """
+    with open(path, encoding='utf-8') as f:
+        questions = [json.loads(line) for line in f if line.strip()]
+    print(f"{len(questions)} questions, {len({q['group'] for q in questions})} groups")
+    print("threshold  precision  recall  hit rate  lookup")
+    for threshold in thresholds:
+        cache = SemanticCache(max_size=len(questions), threshold=threshold)
+        seen = set()
+        true_hits = false_hits = misses = 0
+        started = time.perf_counter()
+        for question in questions:
+            cached = cache.get("benchmark", question["text"])
+            if cached is None:
+                misses += question["group"] in seen
+                cache.put("benchmark", question["text"], question["group"])
+            elif cached == question["group"]:
+                true_hits += 1
+            else:
+                false_hits += 1
+            seen.add(question["group"])
+        elapsed = (time.perf_counter() - started) / len(questions)
+        hits = true_hits + false_hits
+        precision = true_hits / hits if hits else 1.0
+        recall = true_hits / (true_hits + misses) if true_hits + misses else 1.0
+        print(f"{threshold:9.2f}  {precision:9.3f}  {recall:6.3f}  {hits / len(questions):8.3f}  {elapsed * 1e6:.0f} µs")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        sys.exit("Usage: python -m bot_utilities.semantic_cache <questions.jsonl>")
+    benchmark(sys.argv[1])
@@ -0,0 +1,130 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from bot_utilities.config_loader import config
+from bot_utilities.metrics import Counter, QUEUE_DEPTH
+
+logger = logging.getLogger(__name__)
+
+SEND_ACTIONS = Counter("bot_send_actions_total",
+                       "Outbound Discord actions by priority and result (sent/dropped/error)",
+                       ("priority", "result"))
+
+
+class _Bucket:
+    """Token bucket mirroring a Discord rate limit bucket."""
+
+    def __init__(self, capacity, per_second):
+        self.capacity = capacity
+        self.per_second = per_second
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.per_second)
+        self.updated = now
+
+    def delay(self):
+        """Seconds until a token is available."""
+        self._refill()
+        return 0 if self.tokens >= 1 else (1 - self.tokens) / self.per_second
+
+    def take(self):
+        self.tokens -= 1
+
+
+class _ChannelState:
+    __slots__ = ("essential", "cosmetic", "bucket", "task")
+
+    def __init__(self, bucket):
+        self.essential = deque()
+        self.cosmetic = deque()
+        self.bucket = bucket
+        self.task = None
+
+
+class SendDispatcher:
+    """
+    Per-channel queue for outbound Discord REST actions.
+
+    Actions are paced by a per-channel and a global token bucket so bursts
+    wait locally instead of hitting 429s. Essential actions (replies) always
+    run before cosmetic ones (reactions), and cosmetic actions are dropped
+    when the channel is backed up or out of tokens.
+    """
+
+    def __init__(self, channel_capacity=5, channel_rate=1.0, global_rate=50, max_cosmetic_backlog=1):
+        self.channel_capacity = channel_capacity
+        self.channel_rate = channel_rate
+        self.max_cosmetic_backlog = max_cosmetic_backlog
+        self._global = _Bucket(global_rate, global_rate)
+        self._channels = {}
+        self._pending = 0
+
+    def submit(self, channel_id, action, essential=True):
+        """
+        Queues `action` (a callable returning an awaitable) for a channel.
+
+        Returns:
+            asyncio.Future: For essential actions, the action's result or
+            exception. For cosmetic actions, True if it ran, False if it
+            failed and None if it was dropped; it never raises.
+        """
+        future = asyncio.get_running_loop().create_future()
+        state = self._channels.get(channel_id)
+        if state is None:
+            state = self._channels[channel_id] = _ChannelState(_Bucket(self.channel_capacity, self.channel_rate))
+        if not essential and (len(state.essential) + len(state.cosmetic) >= self.max_cosmetic_backlog
+                              or state.bucket.delay() > 0):
+            SEND_ACTIONS.inc("cosmetic", "dropped")
+            future.set_result(None)
+            return future
+        (state.essential if essential else state.cosmetic).append((action, future))
+        self._pending += 1
+        QUEUE_DEPTH.set(self._pending, "send_queue")
+        if state.task is None:
+            state.task = asyncio.create_task(self._run(channel_id, state))
+        return future
+
+    async def _run(self, channel_id, state):
+        try:
+            while state.essential or state.cosmetic:
+                essential = bool(state.essential)
+                action, future = (state.essential if essential else state.cosmetic).popleft()
+                self._pending -= 1
+                QUEUE_DEPTH.set(self._pending, "send_queue")
+                if future.done():
+                    continue
+                while (delay := max(state.bucket.delay(), self._global.delay())) > 0:
+                    await asyncio.sleep(delay)
+                state.bucket.take()
+                self._global.take()
+                await self._execute(action, future, essential)
+        finally:
+            del self._channels[channel_id]
+
+    async def _execute(self, action, future, essential):
+        priority = "essential" if essential else "cosmetic"
+        try:
+            result = await action()
+        except Exception as e:
+            SEND_ACTIONS.inc(priority, "error")
+            if future.done():
+                return
+            if essential:
+                future.set_exception(e)
+            else:
+                logger.debug("Cosmetic action failed: %s", e)
+                future.set_result(False)
+            return
+        SEND_ACTIONS.inc(priority, "sent")
+        if not future.done():
+            future.set_result(result if essential else True)
+
+
+dispatcher = SendDispatcher(channel_capacity=config.get('SEND_CHANNEL_BURST', 5),
+                            channel_rate=config.get('SEND_CHANNEL_RATE', 1.0),
+                            global_rate=config.get('SEND_GLOBAL_RATE', 50),
+                            max_cosmetic_backlog=config.get('SEND_MAX_COSMETIC_BACKLOG', 1))
@@ -0,0 +1,63 @@
+import asyncio
+import inspect
+import logging
+import sqlite3
+import threading
+from bot_utilities.config_loader import config
+from bot_utilities.executors import run_in_pool
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+
+def get_connection():
+    """Returns the calling thread's connection to the local SQLite database."""
+    connection = getattr(_local, 'connection', None)
+    if connection is None:
+        connection = sqlite3.connect(config.get('DATABASE_PATH', 'bot.db'))
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        _local.connection = connection
+    return connection
+
+
+def bump_version(connection, name):
+    """
+    Marks the shared state `name` as changed. Called by its writers inside
+    the transaction that changes it, so watchers see both together.
+    """
+    connection.execute('CREATE TABLE IF NOT EXISTS state_versions (name TEXT PRIMARY KEY, version INTEGER NOT NULL)')
+    connection.execute('INSERT INTO state_versions (name, version) VALUES (?, 1) '
+                       'ON CONFLICT (name) DO UPDATE SET version = version + 1', (name,))
+
+
+def _read_versions():
+    connection = get_connection()
+    connection.execute('CREATE TABLE IF NOT EXISTS state_versions (name TEXT PRIMARY KEY, version INTEGER NOT NULL)')
+    versions = dict(connection.execute('SELECT name, version FROM state_versions'))
+    connection.commit()
+    return versions
+
+
+async def watch_database(callbacks, interval=5):
+    """
+    Calls `callbacks[name]` whenever the version of the shared state `name`
+    was bumped since the last check, e.g. by another process of the cluster.
+    Unrelated writes (history, jobs, the archive) don't trigger anything.
+    Coroutine functions are awaited.
+    """
+    last_versions = await run_in_pool("io", _read_versions)
+    while True:
+        await asyncio.sleep(interval)
+        versions = await run_in_pool("io", _read_versions)
+        for name, callback in callbacks.items():
+            if versions.get(name) == last_versions.get(name):
+                continue
+            try:
+                result = callback()
+                if inspect.isawaitable(result):
+                    await result
+            except Exception:
+                logger.exception("Failed to reload %s changed in the database", name)
+        last_versions = versions
@@ -0,0 +1,129 @@
+import asyncio
+import time
+from bot_utilities.config_loader import config, on_reload
+from bot_utilities.metrics import Counter, Gauge
+from bot_utilities.send_queue import dispatcher
+
+THROTTLED = Counter("bot_throttled_messages_total",
+                    "Messages not answered because a rate limit was exhausted",
+                    ("scope",))
+
+THROTTLE_BUCKETS = Gauge("bot_throttle_buckets", "Token buckets currently held by the throttle",
+                         function=lambda: sum(len(buckets.buckets) for buckets in throttle.scopes.values()))
+
+THROTTLE_NOTICE = "You're sending messages too fast, please wait a moment before asking again."
+
+
+class TokenBuckets:
+    """
+    Token buckets keyed by ID. Each bucket is a two-item list [tokens, updated];
+    buckets that have refilled completely are dropped by `sweep()`.
+    """
+
+    def __init__(self, capacity, per_minute, overrides=None):
+        self.buckets = {}
+        self.configure(capacity, per_minute, overrides)
+
+    def configure(self, capacity, per_minute, overrides=None):
+        """Changes the limits; current bucket levels are kept (capped to the new capacity)."""
+        self.capacity = capacity
+        self.rate = per_minute / 60
+        # {key: (capacity, tokens per second)}
+        self.overrides = {key: (limits[0], limits[1] / 60) for key, limits in (overrides or {}).items()}
+
+    def _limits(self, key):
+        return self.overrides.get(key, (self.capacity, self.rate))
+
+    def available(self, key, now):
+        bucket = self.buckets.get(key)
+        capacity, rate = self._limits(key)
+        if bucket is None:
+            return capacity
+        return min(capacity, bucket[0] + (now - bucket[1]) * rate)
+
+    def take(self, key, now):
+        self.buckets[key] = [self.available(key, now) - 1, now]
+
+    def sweep(self, now):
+        full = [key for key in self.buckets if self.available(key, now) >= self._limits(key)[0]]
+        for key in full:
+            del self.buckets[key]
+
+
+class Throttle:
+    """Per-user, per-channel and per-guild limits on AI replies."""
+
+    def __init__(self):
+        self.scopes = {}
+        self._notified = {}
+        self.configure()
+
+    def configure(self):
+        user = config.get('THROTTLE_USER', [3, 6])
+        channel = config.get('THROTTLE_CHANNEL', [10, 20])
+        guild = config.get('THROTTLE_GUILD', [30, 60])
+        overrides = {int(user_id): limits for user_id, limits in (config.get('THROTTLE_USER_OVERRIDES') or {}).items()}
+        limits = {"user": (*user, overrides), "channel": (*channel, None), "guild": (*guild, None)}
+        # Runs on every reload: existing buckets keep their levels, so
+        # touching config.yml doesn't hand everyone a full bucket again
+        for scope, (capacity, per_minute, scope_overrides) in limits.items():
+            if scope in self.scopes:
+                self.scopes[scope].configure(capacity, per_minute, scope_overrides)
+            else:
+                self.scopes[scope] = TokenBuckets(capacity, per_minute, scope_overrides)
+
+    def check(self, message):
+        """
+        Takes a token from each of the message's buckets.
+
+        Returns:
+            str: The exhausted scope ("user", "channel" or "guild"), or None
+            if the message may be answered. No tokens are taken when a
+            scope is exhausted.
+        """
+        if not config.get('THROTTLE_ENABLED', True):
+            return None
+        now = time.monotonic()
+        keys = {"user": message.author.id, "channel": message.channel.id}
+        if message.guild is not None:
+            keys["guild"] = message.guild.id
+        for scope, key in keys.items():
+            if self.scopes[scope].available(key, now) < 1:
+                THROTTLED.inc(scope)
+                return scope
+        for scope, key in keys.items():
+            self.scopes[scope].take(key, now)
+        return None
+
+    def notify(self, message):
+        """Tells the author they are throttled, at most once a minute per user."""
+        action = config.get('THROTTLE_ACTION', 'reaction')
+        now = time.monotonic()
+        if action == 'silent' or now - self._notified.get(message.author.id, -60) < 60:
+            return
+        self._notified[message.author.id] = now
+        if action == 'notice':
+            send = lambda: message.reply(THROTTLE_NOTICE, delete_after=10, mention_author=False)
+        else:
+            send = lambda: message.add_reaction("⏳")
+        dispatcher.submit(message.channel.id, send, essential=False)
+
+    def sweep(self):
+        now = time.monotonic()
+        for buckets in self.scopes.values():
+            buckets.sweep(now)
+        self._notified = {user_id: at for user_id, at in self._notified.items() if now - at < 60}
+
+
+throttle = Throttle()
+
+
+@on_reload
+def configure_throttle():
+    throttle.configure()
+
+
+async def sweep_throttle(interval=60):
+    while True:
+        await asyncio.sleep(interval)
+        throttle.sweep()
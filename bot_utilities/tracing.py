@@ -0,0 +1,159 @@
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from contextvars import ContextVar
+from bot_utilities.config_loader import config
+from bot_utilities.executors import run_in_pool
+
+# Per-message trace spans written as JSON lines in the OpenTelemetry span
+# shape (traceId, spanId, parentSpanId, start/end time in unix nanoseconds).
+# Run `python -m bot_utilities.tracing [file]` for a latency breakdown.
+
+_current_span = ContextVar("current_span", default=None)
+_finished = []
+
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "attributes", "start", "end", "status", "_token")
+
+    def __init__(self, name, trace_id, parent_id, attributes):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.status = "OK"
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def __enter__(self):
+        self.start = time.time_ns()
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end = time.time_ns()
+        _current_span.reset(self._token)
+        if exc_type is not None:
+            self.status = "ERROR"
+            self.attributes["exception.type"] = exc_type.__name__
+        _finished.append(self.to_dict())
+        if self.parent_id is None:
+            _flush()
+
+    def to_dict(self):
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id or "",
+            "name": self.name,
+            "startTimeUnixNano": self.start,
+            "endTimeUnixNano": self.end,
+            "attributes": [{"key": key, "value": {"stringValue": str(value)}}
+                           for key, value in self.attributes.items()],
+            "status": {"code": self.status},
+        }
+
+
+class _NoopSpan:
+    def set_attribute(self, key, value):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+_noop_span = _NoopSpan()
+
+
+def start_trace(name, **attributes):
+    """Starts a root span, or returns a no-op span if the trace is not sampled."""
+    if random.random() >= config.get('TRACE_SAMPLE_RATE', 0):
+        return _noop_span
+    return Span(name, os.urandom(16).hex(), None, attributes)
+
+
+def span(name, **attributes):
+    """Starts a child span of the current span, a no-op outside a sampled trace."""
+    if (parent := _current_span.get()) is None:
+        return _noop_span
+    return Span(name, parent.trace_id, parent.span_id, attributes)
+
+
+def _flush():
+    batch = _finished[:]
+    _finished.clear()
+    try:
+        asyncio.get_running_loop().create_task(run_in_pool("io", write_spans, batch))
+    except RuntimeError:
+        write_spans(batch)
+
+
+def write_spans(spans, path=None):
+    path = path or config.get('TRACE_FILE', 'traces.jsonl')
+    max_bytes = config.get('TRACE_MAX_BYTES', 10 * 1024 * 1024)
+    if os.path.exists(path) and os.path.getsize(path) > max_bytes:
+        backups = config.get('TRACE_BACKUP_COUNT', 3)
+        for index in range(backups - 1, 0, -1):
+            if os.path.exists(f"{path}.{index}"):
+                os.replace(f"{path}.{index}", f"{path}.{index + 1}")
+        if backups > 0:
+            os.replace(path, f"{path}.1")
+        else:
+            os.remove(path)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write("".join(json.dumps(item) + "\n" for item in spans))
+
+
+def percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def report(path):
+    """Prints p50/p95/p99 per span name and the average share of each stage."""
+    traces = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            item = json.loads(line)
+            traces.setdefault(item["traceId"], []).append(item)
+
+    durations = {}
+    shares = {}
+    for spans in traces.values():
+        roots = [item for item in spans if not item["parentSpanId"]]
+        if not roots:
+            continue
+        root_duration = roots[0]["endTimeUnixNano"] - roots[0]["startTimeUnixNano"]
+        children_total = 0
+        for item in spans:
+            duration = item["endTimeUnixNano"] - item["startTimeUnixNano"]
+            durations.setdefault(item["name"], []).append(duration / 1e6)
+            if item["parentSpanId"] == roots[0]["spanId"]:
+                children_total += duration
+                if root_duration:
+                    shares.setdefault(item["name"], []).append(duration / root_duration)
+        if root_duration:
+            shares.setdefault("(other)", []).append(max(0, root_duration - children_total) / root_duration)
+
+    print(f"{len(traces)} traces from {path}\n")
+    print(f"{'stage':<20}{'count':>8}{'p50 ms':>12}{'p95 ms':>12}{'p99 ms':>12}{'share':>10}")
+    for name, values in sorted(durations.items(), key=lambda item: -sum(item[1])):
+        values.sort()
+        share = shares.get(name)
+        share_text = f"{100 * sum(share) / len(share):.1f}%" if share else "-"
+        print(f"{name:<20}{len(values):>8}{percentile(values, 0.5):>12.1f}"
+              f"{percentile(values, 0.95):>12.1f}{percentile(values, 0.99):>12.1f}{share_text:>10}")
+    if other := shares.get("(other)"):
+        print(f"{'(other)':<20}{'':>44}{100 * sum(other) / len(other):>9.1f}%")
+
+
+if __name__ == "__main__":
+    report(sys.argv[1] if len(sys.argv) > 1 else config.get('TRACE_FILE', 'traces.jsonl'))
@@ -0,0 +1,95 @@
+import asyncio
+import logging
+import os
+import signal
+import subprocess
+import sys
+import time
+import aiohttp
+from dotenv import load_dotenv
+from bot_utilities.config_loader import config
+from bot_utilities.log_util import setup_logging
+
+# Runs CLUSTER_COUNT bot processes, each owning a contiguous range of the
+# SHARD_COUNT gateway shards. Shared state (active channels, per-guild
+# settings, conversation memory) lives in the local SQLite database.
+
+load_dotenv()
+setup_logging()
+logger = logging.getLogger("cluster")
+
+
+async def fetch_recommended_shards(token):
+  async with aiohttp.ClientSession() as session:
+    async with session.get("https://discord.com/api/v10/gateway/bot",
+                           headers={"Authorization": f"Bot {token}"}) as response:
+      response.raise_for_status()
+      return (await response.json())["shards"]
+
+
+def shard_ranges(shard_count, cluster_count):
+  """Splits shard IDs 0..shard_count-1 into cluster_count contiguous ranges."""
+  size, extra = divmod(shard_count, cluster_count)
+  ranges = []
+  start = 0
+  for cluster_id in range(cluster_count):
+    end = start + size + (1 if cluster_id < extra else 0)
+    ranges.append(range(start, end))
+    start = end
+  return ranges
+
+
+def start_process(cluster_id, shards, shard_count):
+  env = dict(os.environ,
+             CLUSTER_ID=str(cluster_id),
+             SHARD_COUNT=str(shard_count),
+             SHARD_IDS=",".join(map(str, shards)))
+  logger.info("Starting cluster %s with shards %s-%s", cluster_id, shards[0],
+              shards[-1])
+  return subprocess.Popen([sys.executable, "main.py"], env=env)
+
+
+def main():
+  cluster_count = config.get('CLUSTER_COUNT', 1)
+  if config.get('CHANNELS_BACKEND', 'json') != 'sqlite' or config.get(
+      'HISTORY_BACKEND', 'memory') != 'sqlite':
+    sys.exit("Running a cluster requires CHANNELS_BACKEND: sqlite and "
+             "HISTORY_BACKEND: sqlite in config.yml")
+
+  shard_count = config.get('SHARD_COUNT', 1)
+  if shard_count == 0:
+    shard_count = asyncio.run(
+        fetch_recommended_shards(os.environ["DISCORD_TOKEN"]))
+  shard_count = max(shard_count, cluster_count)
+  ranges = shard_ranges(shard_count, cluster_count)
+
+  processes = {
+      cluster_id: start_process(cluster_id, shards, shard_count)
+      for cluster_id, shards in enumerate(ranges)
+  }
+  stopping = False
+
+  def stop(signum, frame):
+    nonlocal stopping
+    stopping = True
+    for process in processes.values():
+      process.terminate()
+
+  signal.signal(signal.SIGTERM, stop)
+  signal.signal(signal.SIGINT, stop)
+
+  while not stopping:
+    time.sleep(1)
+    for cluster_id, process in list(processes.items()):
+      if process.poll() is not None and not stopping:
+        logger.warning("Cluster %s exited with code %s, restarting",
+                       cluster_id, process.returncode)
+        processes[cluster_id] = start_process(cluster_id, ranges[cluster_id],
+                                              shard_count)
+
+  for process in processes.values():
+    process.wait()
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,18 @@
+import os
+import pytest
+
+# ai_utils creates its API client on import
+os.environ.setdefault("CHIMERA_GPT_KEY", "test")
+
+
+@pytest.fixture(autouse=True)
+def database(tmp_path, monkeypatch):
+    """Points the local SQLite database at a new file for every test."""
+    from bot_utilities import storage
+    from bot_utilities.config_loader import config
+    from bot_utilities.executors import shutdown_pools
+    monkeypatch.setitem(config, 'DATABASE_PATH', str(tmp_path / "bot.db"))
+    monkeypatch.setattr(storage._local, 'connection', None, raising=False)
+    yield
+    # Pool threads keep their connection to this test's file
+    shutdown_pools()
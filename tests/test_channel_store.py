@@ -0,0 +1,64 @@
+import asyncio
+import json
+from bot_utilities.channel_store import ChannelStore, JsonChannelBackend, SqliteChannelBackend
+
+
+class CountingBackend(JsonChannelBackend):
+    def __init__(self, path):
+        super().__init__(path)
+        self.saves = []
+
+    def save(self, channels, changed):
+        self.saves.append(set(changed))
+        super().save(channels, changed)
+
+
+def test_a_burst_of_changes_is_written_once(tmp_path):
+    backend = CountingBackend(str(tmp_path / "channels.json"))
+
+    async def main():
+        store = ChannelStore(backend, save_delay=0.05)
+        for channel_id in ("1", "2", "3"):
+            store[channel_id] = "assist"
+        del store["2"]
+        await asyncio.sleep(0.2)
+
+    asyncio.run(main())
+    assert backend.saves == [{"1", "2", "3"}]
+    assert json.loads((tmp_path / "channels.json").read_text()) == {"1": "assist", "3": "assist"}
+    # Nothing but the registry is left in the directory
+    assert [path.name for path in tmp_path.iterdir()] == ["channels.json"]
+
+
+def test_sqlite_imports_the_json_registry_once(tmp_path):
+    path = tmp_path / "channels.json"
+    path.write_text(json.dumps({"1": "assist", "2": {"persona": "assist", "response_cache": True}}))
+
+    async def main():
+        store = ChannelStore(SqliteChannelBackend(str(path)), save_delay=0)
+        assert store.persona("2") == "assist"
+        assert store.options("2") == {"response_cache": True}
+        del store["1"]
+        del store["2"]
+        await asyncio.sleep(0.1)
+        # Deactivating every channel must not bring the JSON entries back
+        await store.reload()
+        return dict(store.items())
+
+    assert asyncio.run(main()) == {}
+    assert SqliteChannelBackend(None).load() == {}
+
+
+def test_reload_keeps_unsaved_changes(tmp_path):
+    async def main():
+        store = ChannelStore(SqliteChannelBackend(None), save_delay=60)
+        other = SqliteChannelBackend(None)
+        other.load()
+        other.save({"1": "assist", "2": "assist"}, {"1", "2"})
+        store["3"] = "assist"
+        await store.reload()
+        channels = dict(store.items())
+        store._save_task.cancel()
+        return channels
+
+    assert asyncio.run(main()) == {"1": "assist", "2": "assist", "3": "assist"}
@@ -0,0 +1,68 @@
+import asyncio
+import shutil
+import pytest
+from bot_utilities import config_loader
+from bot_utilities.config_loader import config, reload_config, watch_config
+
+
+@pytest.fixture
+def files(tmp_path, monkeypatch):
+    """Copies of config.yml, lang/ and instructions/ the loader reads instead."""
+    shutil.copy(config_loader.config_path, tmp_path / "config.yml")
+    shutil.copytree(config_loader.lang_directory, tmp_path / "lang")
+    shutil.copytree(config_loader.instructions_directory, tmp_path / "instructions")
+    monkeypatch.setattr(config_loader, "config_path", str(tmp_path / "config.yml"))
+    monkeypatch.setattr(config_loader, "lang_directory", str(tmp_path / "lang"))
+    monkeypatch.setattr(config_loader, "instructions_directory", str(tmp_path / "instructions"))
+    monkeypatch.setattr(config_loader, "_reload_callbacks", [])
+    yield tmp_path
+    monkeypatch.undo()
+    reload_config()
+
+
+def edit(path, old, new):
+    text = path.read_text(encoding="utf-8")
+    assert old in text
+    path.write_text(text.replace(old, new), encoding="utf-8")
+
+
+def test_missing_keys_keep_the_previous_config(files):
+    edit(files / "config.yml", "GPT_MODEL:", "#GPT_MODEL:")
+    model = config['GPT_MODEL']
+    assert not reload_config()
+    assert config['GPT_MODEL'] == model
+
+
+def test_unknown_language_keeps_the_previous_config(files):
+    language = config['LANGUAGE']
+    edit(files / "config.yml", f"LANGUAGE: {language}", "LANGUAGE: xx")
+    assert not reload_config()
+    assert config['LANGUAGE'] == language
+
+
+def test_failing_callback_does_not_stop_the_others(files):
+    calls = []
+
+    @config_loader.on_reload
+    def broken():
+        raise RuntimeError("broken callback")
+
+    config_loader.on_reload(lambda: calls.append(config['MAX_HISTORY']))
+    edit(files / "config.yml", f"MAX_HISTORY: {config['MAX_HISTORY']}", "MAX_HISTORY: 123")
+    assert reload_config()
+    assert calls == [123]
+
+
+def test_watcher_survives_a_missing_directory(files):
+    async def main():
+        watcher = asyncio.create_task(watch_config(interval=0.01))
+        shutil.move(files / "lang", files / "lang.old")
+        await asyncio.sleep(0.1)
+        shutil.move(files / "lang.old", files / "lang")
+        edit(files / "config.yml", f"MAX_HISTORY: {config['MAX_HISTORY']}", "MAX_HISTORY: 77")
+        await asyncio.sleep(0.2)
+        assert not watcher.done()
+        watcher.cancel()
+
+    asyncio.run(main())
+    assert config['MAX_HISTORY'] == 77
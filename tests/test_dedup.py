@@ -0,0 +1,43 @@
+import asyncio
+from bot_utilities.dedup import DuplicateIndex
+
+RAID = "join my server for free nitro right now"
+
+
+def test_copies_only_count_within_their_scope():
+    index = DuplicateIndex()
+    assert index.record(RAID, ("guild", 1), 10).hits == 1
+    assert index.record(RAID, ("guild", 1), 11).hits == 2
+    assert index.record(RAID, ("guild", 2), 20).hits == 1
+    assert index.record(RAID, ("dm", 30), 30).hits == 1
+    assert index.record(RAID, ("dm", 31), 31).hits == 1
+
+
+def test_top_lists_only_the_scope():
+    index = DuplicateIndex()
+    for scope in (("guild", 1), ("guild", 1), ("guild", 2), ("guild", 2), ("dm", 30), ("dm", 30)):
+        index.record(RAID, scope, scope[1])
+    assert index.top(("guild", 1)) == [(RAID, 2, 1)]
+    assert index.top(("guild", 3)) == []
+
+
+def test_short_messages_are_not_tracked():
+    assert DuplicateIndex(min_length=20).record("hi", ("guild", 1), 10) is None
+
+
+def test_share_runs_one_generation_per_key():
+    index = DuplicateIndex()
+    calls = []
+
+    async def generate():
+        calls.append(None)
+        response = f"answer {len(calls)}"
+        await asyncio.sleep(0.01)
+        return response
+
+    async def main():
+        entry = index.record(RAID, ("guild", 1), 10)
+        return await asyncio.gather(index.share(entry, "a", generate), index.share(entry, "a", generate),
+                                    index.share(entry, "b", generate))
+
+    assert asyncio.run(main()) == ["answer 1", "answer 1", "answer 2"]
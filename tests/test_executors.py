@@ -0,0 +1,11 @@
+import asyncio
+from bot_utilities.executors import get_pool, run_in_pool
+
+
+def test_cpu_pool_does_not_fork_the_threaded_process():
+    assert asyncio.run(run_in_pool("cpu", abs, -3)) == 3
+    assert get_pool("cpu")._mp_context.get_start_method() == "forkserver"
+
+
+def test_io_pool_runs_blocking_functions():
+    assert asyncio.run(run_in_pool("io", sorted, [3, 1, 2])) == [1, 2, 3]
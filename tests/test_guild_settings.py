@@ -0,0 +1,53 @@
+import asyncio
+import json
+import sqlite3
+import pytest
+from bot_utilities import guild_settings
+from bot_utilities.config_loader import config
+from bot_utilities.guild_settings import (get_guild_settings, reload_guild_settings, reset_guild_setting,
+                                          set_guild_setting, validate_setting)
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    monkeypatch.setattr(guild_settings, "_overrides", None)
+    monkeypatch.setattr(guild_settings, "_effective", {})
+
+
+@pytest.mark.parametrize("key, value", [
+    ('MAX_HISTORY', 0), ('MAX_HISTORY', -3), ('MAX_HISTORY', True), ('MAX_SEARCH_RESULTS', 0),
+    ('TRIGGER', ["hey", ""]), ('TRIGGER', ["hey", 3]), ('TRIGGER', "hey"),
+    ('LANGUAGE', "xx"), ('INSTRUCTIONS', "no such persona"), ('BLACKLIST_WORDS', []),
+])
+def test_invalid_values_are_rejected(key, value):
+    with pytest.raises(ValueError):
+        validate_setting(key, value)
+
+
+def test_valid_values_are_accepted():
+    validate_setting('MAX_HISTORY', 1)
+    validate_setting('TRIGGER', ["hey bot"])
+    validate_setting('LANGUAGE', config['LANGUAGE'])
+
+
+def test_overrides_apply_to_their_guild_only():
+    set_guild_setting(1, 'MAX_HISTORY', config['MAX_HISTORY'] + 5)
+    assert get_guild_settings(1)['MAX_HISTORY'] == config['MAX_HISTORY'] + 5
+    assert get_guild_settings(2)['MAX_HISTORY'] == config['MAX_HISTORY']
+    assert get_guild_settings(None)['MAX_HISTORY'] == config['MAX_HISTORY']
+    reset_guild_setting(1, 'MAX_HISTORY')
+    assert get_guild_settings(1)['MAX_HISTORY'] == config['MAX_HISTORY']
+
+
+def test_reload_picks_up_changes_from_other_processes():
+    asyncio.run(reload_guild_settings())
+    assert get_guild_settings(1)['TRIGGER'] == config['TRIGGER']
+    other = sqlite3.connect(config['DATABASE_PATH'])
+    with other:
+        other.execute('INSERT INTO guild_settings VALUES (1, ?, ?)', ('TRIGGER', json.dumps(["other"])))
+    other.close()
+    # Lookups don't query the database
+    assert get_guild_settings(1)['TRIGGER'] == config['TRIGGER']
+    asyncio.run(reload_guild_settings())
+    assert get_guild_settings(1)['TRIGGER'] == ["other"]
+    assert get_guild_settings(1)['TRIGGER_PATTERN'].search("hello other")
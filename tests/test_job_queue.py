@@ -0,0 +1,39 @@
+import pytest
+from bot_utilities import job_queue
+from bot_utilities.job_queue import claim_job, complete_job, count_jobs, enqueue_job
+
+
+@pytest.fixture(autouse=True)
+def clock(monkeypatch):
+    job_queue._create_table()
+    now = [1000.0]
+    monkeypatch.setattr(job_queue.time, "time", lambda: now[0])
+    return now
+
+
+def test_jobs_are_claimed_oldest_first_and_once():
+    enqueue_job({"n": 1})
+    enqueue_job({"n": 2})
+    first = claim_job("a")
+    second = claim_job("b")
+    assert first[1] == {"n": 1}
+    assert second[1] == {"n": 2}
+    assert claim_job("c") is None
+
+
+def test_unfinished_jobs_become_claimable_after_the_timeout(clock):
+    enqueue_job({"n": 1})
+    job_id, _ = claim_job("a", visibility_timeout=60)
+    clock[0] += 59
+    assert claim_job("b", visibility_timeout=60) is None
+    clock[0] += 2
+    assert claim_job("b", visibility_timeout=60) == (job_id, {"n": 1})
+
+
+def test_completed_jobs_are_removed(clock):
+    enqueue_job({"n": 1})
+    job_id, _ = claim_job("a", visibility_timeout=60)
+    complete_job(job_id)
+    assert count_jobs() == 0
+    clock[0] += 120
+    assert claim_job("b", visibility_timeout=60) is None
@@ -0,0 +1,32 @@
+import threading
+import traceback
+from bot_utilities.loop_monitor import BlockingDetector
+
+
+def test_top_ranks_by_total_stall_time():
+    detector = BlockingDetector()
+    stack = traceback.extract_stack()
+    detector._record(stack)
+    detector.tick(0.5)
+    blockers = detector.top()
+    assert len(blockers) == 1
+    assert blockers[0][1:] == (1, 0.5)
+
+
+def test_top_while_the_watchdog_records():
+    detector = BlockingDetector()
+    stack = traceback.extract_stack()
+    done = threading.Event()
+
+    def record():
+        for i in range(1000):
+            detector._record(list(stack) + [traceback.FrameSummary(f"{detector._project_dir}/site_{i}.py", i, "f")])
+            detector._stall_key = None
+        done.set()
+
+    thread = threading.Thread(target=record)
+    thread.start()
+    while not done.is_set():
+        detector.top()
+    thread.join()
+    assert len(detector.blockers) == 1000
@@ -0,0 +1,52 @@
+import asyncio
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from bot_utilities import memory as memory_module
+from bot_utilities.archive import DM_GUILD_ID
+from bot_utilities.memory import MemoryIndex
+
+QUERY = "what is my favourite pizza topping"
+ARCHIVE = [
+    (1, 1, 10, 100, "my favourite pizza topping is pineapple with ham", 1.0),
+    (2, 1, 20, 200, "my favourite pizza topping is anchovies with olives", 2.0),
+    (3, 2, 30, 100, "my favourite pizza topping is mushrooms with garlic", 3.0),
+    (4, 3, 10, 100, "my favourite pizza topping is pepperoni with chili", 4.0),
+    (5, 1, 50, DM_GUILD_ID, "my favourite pizza topping is a secret between us", 5.0),
+]
+
+
+@pytest.fixture
+def index(tmp_path, monkeypatch):
+    def fetch_messages(after_id, limit=1000):
+        return [row for row in ARCHIVE if row[0] > after_id][:limit]
+
+    monkeypatch.setattr(memory_module, "fetch_messages", fetch_messages)
+    index = MemoryIndex(path=str(tmp_path / "memory_index"))
+    index.load()
+    asyncio.run(index.update())
+    return index
+
+
+def recalled(index, guild_id, user_id, channel_id):
+    return {content.split()[-1] for _, _, content in index.lookup(guild_id, user_id, channel_id, QUERY,
+                                                                     k=10, min_score=0)}
+
+
+def test_only_the_users_messages_in_the_server_and_the_channels_are_recalled(index):
+    assert recalled(index, 100, 1, 11) == {"ham"}
+    assert recalled(index, 100, 1, 10) == {"ham", "chili"}
+    assert recalled(index, 200, 1, 21) == {"olives"}
+    assert recalled(index, 300, 1, 31) == set()
+
+
+def test_direct_messages_stay_in_direct_messages(index):
+    assert recalled(index, DM_GUILD_ID, 1, 50) == {"us"}
+    assert recalled(index, DM_GUILD_ID, 2, 51) == set()
+
+
+def test_followers_see_the_same_scopes(index):
+    follower = MemoryIndex(path=index.path, writer=False)
+    follower.load()
+    assert recalled(follower, 100, 1, 10) == {"ham", "chili"}
@@ -0,0 +1,51 @@
+import pytest
+from bot_utilities import message_search
+from bot_utilities.message_search import index_messages, search_messages
+
+
+@pytest.fixture(autouse=True)
+def archive():
+    message_search._create_tables()
+    index_messages([
+        (1, 10, 100, 1000, "the deploy failed again", 1.0),
+        (2, 11, 100, 1000, "Deploy worked, café is open", 2.0),
+        (3, 10, 200, 2000, "deploy from the other server", 3.0),
+        (4, 12, 100, 1000, "", 4.0),
+    ])
+
+
+def ids(results):
+    return [row[0] for row in results]
+
+
+def test_every_keyword_must_match():
+    assert ids(search_messages("deploy")) == [3, 2, 1]
+    assert ids(search_messages("deploy failed")) == [1]
+    assert ids(search_messages("cafe")) == [2]
+
+
+def test_results_stay_in_scope():
+    assert ids(search_messages("deploy", guild_id=1000)) == [2, 1]
+    assert ids(search_messages("deploy", user_id=10, guild_id=1000)) == [1]
+    assert ids(search_messages(guild_id=2000)) == [3]
+
+
+def test_time_range():
+    assert ids(search_messages("deploy", after=2.0)) == [3, 2]
+    assert ids(search_messages("deploy", before=3.0)) == [2, 1]
+    assert search_messages("deploy", after=5.0) == []
+
+
+def test_query_syntax_is_not_interpreted():
+    assert ids(search_messages('deploy OR "failed')) == []
+    assert ids(search_messages("deploy*")) == [3, 2, 1]
+
+
+def test_keywords_without_words_match_nothing():
+    assert search_messages("!!!") == []
+    assert search_messages("!!!", guild_id=1000) == []
+
+
+def test_snippets_mark_matches():
+    [(_, _, _, _, snippet)] = search_messages("failed")
+    assert "**failed**" in snippet
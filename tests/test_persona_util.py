@@ -0,0 +1,15 @@
+from types import SimpleNamespace
+from bot_utilities.persona_util import build_dynamic_context
+
+USER = SimpleNamespace(display_name="Alice", status="offline", activities=[SimpleNamespace(name="Chess")])
+
+
+def test_status_is_left_out_without_presences():
+    context = build_dynamic_context(USER, presences=False)
+    assert "Alice" in context
+    assert "offline" not in context and "Chess" not in context
+
+
+def test_status_is_included_with_presences():
+    context = build_dynamic_context(USER)
+    assert "(status: offline)" in context and "Chess" in context
@@ -0,0 +1,148 @@
+import asyncio
+import contextlib
+import pytest
+from bot_utilities import reply_pipeline
+from bot_utilities.config_loader import config
+from bot_utilities.history_store import HistoryStore
+from bot_utilities.response_cache import response_cache
+
+SETTINGS = {'GPT_MODEL': 'gpt-3.5-turbo', 'LANGUAGE': 'pl', 'MAX_HISTORY': 8, 'MAX_SEARCH_RESULTS': 3}
+QUESTION = "what are the rules about posting links here?"
+
+
+class FakeChannel:
+    def __init__(self, channel_id):
+        self.id = channel_id
+        self.sent = []
+
+    def typing(self):
+        return contextlib.nullcontext()
+
+    async def send(self, content):
+        self.sent.append(content)
+
+
+class FakeMessage:
+    def __init__(self):
+        self.replies = []
+
+    async def reply(self, content=None, **payload):
+        self.replies.append(content if content is not None else payload.get("content"))
+
+
+@pytest.fixture(autouse=True)
+def generations(monkeypatch):
+    """Replaces search and the LLM, returns the contexts answers were generated with."""
+    contexts = []
+
+    async def generate_response(instructions, search, history, context, model):
+        contexts.append(context)
+        return f"answer {len(contexts)}"
+
+    async def no_search(prompt, max_results=None):
+        return None
+
+    monkeypatch.setattr(reply_pipeline, "generate_response", generate_response)
+    monkeypatch.setattr(reply_pipeline, "search", no_search)
+    monkeypatch.setitem(config, 'INTERNET_ACCESS', False)
+    monkeypatch.setitem(config, 'DEDUP_ACTION', 'off')
+    monkeypatch.setattr(reply_pipeline, "semantic_cache", None)
+    response_cache.clear()
+    yield contexts
+    response_cache.clear()
+
+
+def ask(guild_id, channel_id, content=QUESTION, user_id=1, **kwargs):
+    target = FakeMessage()
+    asyncio.run(reply_pipeline.answer(target, FakeChannel(channel_id), None, content=content, context="context",
+                                      persona=config['INSTRUCTIONS'], settings=SETTINGS,
+                                      history_store=HistoryStore(), key=f"{user_id}-{channel_id}",
+                                      guild_id=guild_id, cache=True, **kwargs))
+    return target.replies
+
+
+def test_cached_answers_stay_in_their_guild(generations):
+    assert ask(1, 10) == ["answer 1"]
+    assert ask(1, 11, user_id=2) == ["answer 1"]
+    assert ask(2, 20) == ["answer 2"]
+    assert ask(None, 30) == ["answer 3"]
+    assert len(generations) == 3
+
+
+def test_paraphrases_stay_in_their_guild(generations, monkeypatch):
+    pytest.importorskip("numpy")
+    from bot_utilities.semantic_cache import SemanticCache
+    monkeypatch.setattr(reply_pipeline, "semantic_cache", SemanticCache(max_size=10, threshold=0.9))
+    assert ask(1, 10) == ["answer 1"]
+    # Only the semantic cache can answer from here on
+    response_cache.clear()
+    assert ask(1, 10) == ["answer 1"]
+    response_cache.clear()
+    assert ask(2, 20) == ["answer 2"]
+
+
+def test_answers_with_recalled_memory_are_not_cached(generations):
+    assert ask(1, 10, memory="- <@1>: my password hint is blue") == ["answer 1"]
+    assert generations[0].endswith("my password hint is blue")
+    assert ask(1, 10, user_id=2) == ["answer 2"]
+    assert ask(1, 10, user_id=3, memory="- <@3>: I like cats") == ["answer 3"]
+    assert ask(1, 10, user_id=4) == ["answer 2"]
+
+
+def test_drop_only_ignores_copies_in_the_same_guild(generations, monkeypatch):
+    monkeypatch.setitem(config, 'DEDUP_ACTION', 'drop')
+    raid = "drop mode raid message text"
+    assert ask(1, 10, content=raid) == ["answer 1"]
+    assert ask(1, 11, content=raid, user_id=2) == []
+    assert ask(2, 20, content=raid, user_id=3) == ["answer 2"]
+
+
+def test_share_ignores_the_askers_context(generations, monkeypatch):
+    monkeypatch.setitem(config, 'DEDUP_ACTION', 'share')
+    raid = "share mode raid message text"
+
+    async def copy(user_id, channel_id, context):
+        target = FakeMessage()
+        await reply_pipeline.answer(target, FakeChannel(channel_id), None, content=raid, context=context,
+                                    persona=config['INSTRUCTIONS'], settings=SETTINGS, history_store=HistoryStore(),
+                                    key=f"{user_id}-{channel_id}", guild_id=1)
+        return target.replies
+
+    async def main():
+        return await asyncio.gather(copy(1, 10, "It's 12:00:01. You are talking to Alice."),
+                                    copy(2, 11, "It's 12:00:02. You are talking to Bob."))
+
+    assert asyncio.run(main()) == [["answer 1"], ["answer 1"]]
+
+
+@pytest.mark.parametrize("empty", ["", "  \n\t "])
+def test_empty_answers_reply_with_an_error(monkeypatch, empty):
+    async def generate_response(instructions, search, history, context, model):
+        return empty
+
+    monkeypatch.setattr(reply_pipeline, "generate_response", generate_response)
+    assert ask(1, 10) == [reply_pipeline.GENERATION_ERROR]
+    # Nothing was cached, the next copy is generated again
+    assert ask(1, 10) == [reply_pipeline.GENERATION_ERROR]
+    assert len(response_cache) == 0
+
+
+def test_oldest_history_is_left_out_over_the_token_budget(monkeypatch):
+    sent = []
+
+    async def generate_response(instructions, search, history, context, model):
+        sent.append(history)
+        return "answer"
+
+    monkeypatch.setattr(reply_pipeline, "generate_response", generate_response)
+    _, prompt_tokens = reply_pipeline.get_persona_prompt(reply_pipeline.instructions, config['INSTRUCTIONS'],
+                                                              False)
+    # Room for the question and two 100 token messages
+    monkeypatch.setitem(config, 'PROMPT_TOKEN_BUDGET', prompt_tokens + 250)
+    store = HistoryStore()
+    for n in range(4):
+        asyncio.run(store.append("1-10", {"role": "user", "content": str(n) * 396}))
+    asyncio.run(reply_pipeline.answer(FakeMessage(), FakeChannel(10), None, content="hi", context="context",
+                                      persona=config['INSTRUCTIONS'], settings=SETTINGS, history_store=store,
+                                      key="1-10", guild_id=1))
+    assert [message["content"][0] for message in sent[0]] == ["2", "3", "h"]
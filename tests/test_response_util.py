@@ -0,0 +1,56 @@
+import re
+from hypothesis import given, settings, strategies as st
+from bot_utilities.response_util import ResponseSplitter, split_response
+
+FENCE_LINE = re.compile(r'^\s*(```|~~~)\S*\s*$')
+
+words = st.text(alphabet="abcdefghij", min_size=1, max_size=40)
+lines = st.one_of(
+    st.lists(words, max_size=30).map(" ".join),
+    words.map(lambda word: word * 20),  # Longer than any chunk, no space to cut at
+    st.sampled_from(["```", "```python", "~~~", "  ```js", ""]),
+)
+texts = st.lists(lines, max_size=40).map("\n".join)
+max_lengths = st.integers(min_value=20, max_value=300)
+
+
+def _content(text):
+    # Text without whitespace and without fence lines, which the splitter
+    # adds when it closes and reopens a code block across chunks
+    return "".join("".join(line.split()) for line in text.split("\n") if not FENCE_LINE.match(line))
+
+
+@settings(max_examples=300, deadline=None)
+@given(texts, max_lengths)
+def test_chunks_fit_the_limit(text, max_length):
+    for chunk in split_response(text, max_length):
+        assert len(chunk) <= max_length
+
+
+@settings(max_examples=300, deadline=None)
+@given(texts, max_lengths)
+def test_no_content_is_lost(text, max_length):
+    chunks = split_response(text, max_length)
+    assert _content("\n".join(chunks)) == _content(text)
+    assert all(chunk.strip() for chunk in chunks)
+
+
+@settings(max_examples=300, deadline=None)
+@given(texts, max_lengths, st.lists(st.integers(min_value=0, max_value=2000), max_size=20))
+def test_streaming_matches_one_shot(text, max_length, cuts):
+    splitter = ResponseSplitter(max_length)
+    chunks = []
+    start = 0
+    for cut in sorted(cuts):
+        chunks += splitter.feed(text[start:cut])
+        start = max(start, cut)
+    chunks += splitter.feed(text[start:])
+    chunks += splitter.flush()
+    assert chunks == split_response(text, max_length)
+
+
+def test_very_long_line():
+    line = "word " * 200000
+    chunks = split_response(line, 1999)
+    assert all(len(chunk) <= 1999 for chunk in chunks)
+    assert _content("\n".join(chunks)) == _content(line)
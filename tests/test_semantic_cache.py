@@ -0,0 +1,55 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from bot_utilities import semantic_cache as semantic_cache_module
+from bot_utilities.semantic_cache import SemanticCache, persist_semantic_cache
+
+
+def test_paraphrase_hits_only_its_scope():
+    cache = SemanticCache(max_size=10, threshold=0.9)
+    cache.put("guild-1", "What is the capital of France?", "Paris")
+    assert cache.get("guild-1", "what is the capital of france") == "Paris"
+    assert cache.get("guild-2", "what is the capital of france") is None
+    assert cache.get("guild-1", "what is the capital of germany") is None
+
+
+def test_concurrent_puts_keep_every_row():
+    cache = SemanticCache(max_size=200)
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(lambda i: cache.put("scope", f"question number {i}", i), range(200)))
+    assert cache.size == 200
+    assert sorted(cache.responses) == list(range(200))
+
+
+def test_missing_vectors_start_empty(tmp_path):
+    path = str(tmp_path / "cache")
+    cache = SemanticCache(max_size=10, path=path)
+    cache.put("scope", "What is the capital of France?", "Paris")
+    cache.save()
+    assert SemanticCache(max_size=10, path=path).size == 1
+    os.remove(f"{path}.npy")
+    assert SemanticCache(max_size=10, path=path).size == 0
+
+
+def test_persistence_continues_after_a_failed_save(monkeypatch):
+    saves = []
+
+    class FailingCache:
+        def save(self):
+            saves.append(None)
+            raise OSError("disk full")
+
+    monkeypatch.setattr(semantic_cache_module, "semantic_cache", FailingCache())
+
+    async def main():
+        task = asyncio.create_task(persist_semantic_cache(interval=0.01))
+        await asyncio.sleep(0.1)
+        assert not task.done()
+        task.cancel()
+
+    asyncio.run(main())
+    assert len(saves) > 1
@@ -0,0 +1,26 @@
+import asyncio
+from bot_utilities.storage import bump_version, get_connection, watch_database
+
+
+def test_watchers_only_run_for_bumped_state():
+    calls = []
+
+    async def reload_b():
+        calls.append("b")
+
+    async def main():
+        task = asyncio.create_task(watch_database({"a": lambda: calls.append("a"), "b": reload_b}, interval=0.01))
+        await asyncio.sleep(0.1)
+        connection = get_connection()
+        with connection:
+            # Writes to other tables are not changes to watched state
+            connection.execute('CREATE TABLE history (content TEXT)')
+            connection.execute("INSERT INTO history VALUES ('hello')")
+        await asyncio.sleep(0.1)
+        with connection:
+            bump_version(connection, "b")
+        await asyncio.sleep(0.1)
+        task.cancel()
+
+    asyncio.run(main())
+    assert calls == ["b"]
@@ -0,0 +1,49 @@
+from types import SimpleNamespace
+import pytest
+from bot_utilities.config_loader import config
+from bot_utilities.throttle import Throttle, TokenBuckets
+
+
+def message(user_id=1, channel_id=10, guild_id=100):
+    return SimpleNamespace(author=SimpleNamespace(id=user_id), channel=SimpleNamespace(id=channel_id),
+                           guild=SimpleNamespace(id=guild_id) if guild_id is not None else None)
+
+
+@pytest.fixture
+def limits(monkeypatch):
+    monkeypatch.setitem(config, 'THROTTLE_ENABLED', True)
+    monkeypatch.setitem(config, 'THROTTLE_USER', [2, 1])
+    monkeypatch.setitem(config, 'THROTTLE_CHANNEL', [100, 100])
+    monkeypatch.setitem(config, 'THROTTLE_GUILD', [100, 100])
+    monkeypatch.setitem(config, 'THROTTLE_USER_OVERRIDES', {})
+
+
+def test_bucket_refills_at_its_rate():
+    buckets = TokenBuckets(2, 60)
+    buckets.take("a", 0)
+    buckets.take("a", 0)
+    assert buckets.available("a", 0) == 0
+    assert buckets.available("a", 0.5) == 0.5
+    assert buckets.available("a", 10) == 2
+    buckets.sweep(10)
+    assert buckets.buckets == {}
+
+
+def test_user_is_throttled_after_the_burst(limits):
+    throttle = Throttle()
+    assert throttle.check(message()) is None
+    assert throttle.check(message()) is None
+    assert throttle.check(message()) == "user"
+    assert throttle.check(message(user_id=2)) is None
+
+
+def test_reconfigure_keeps_bucket_levels(limits, monkeypatch):
+    throttle = Throttle()
+    throttle.check(message())
+    throttle.check(message())
+    throttle.configure()
+    assert throttle.check(message()) == "user"
+    monkeypatch.setitem(config, 'THROTTLE_USER', [5, 1])
+    throttle.configure()
+    assert throttle.scopes["user"].capacity == 5
+    assert throttle.check(message()) == "user"
@@ -0,0 +1,77 @@
+import asyncio
+import logging
+import os
+import socket
+import discord
+from dotenv import load_dotenv
+from bot_utilities.config_loader import config, watch_config
+from bot_utilities.log_util import setup_logging
+from bot_utilities.executors import run_in_pool, shutdown_pools
+from bot_utilities.history_store import create_history_store
+from bot_utilities.job_queue import claim_job, complete_job
+from bot_utilities.reply_pipeline import answer
+from bot_utilities.tracing import start_trace
+
+# Worker process for MODE: gateway. Pulls reply jobs enqueued by the gateway
+# process and answers them over the Discord REST API only (no gateway
+# connection), so any number of workers can run next to one gateway.
+
+load_dotenv()
+setup_logging()
+logger = logging.getLogger("worker")
+worker_id = f"{socket.gethostname()}-{os.getpid()}"
+
+
+async def process_job(client, history_store, job_id, job):
+  channel = client.get_partial_messageable(job["channel_id"])
+  target = channel.get_partial_message(job["message_id"])
+  try:
+    with start_trace("worker_job", channel=job["channel_id"],
+                     guild=job["guild_id"]):
+      await answer(target,
+                   channel,
+                   client.user,
+                   content=job["content"],
+                   context=job["context"],
+                   persona=job["persona"],
+                   settings=job["settings"],
+                   history_store=history_store,
+                   key=f"{job['author_id']}-{job['channel_id']}",
+                   guild_id=job["guild_id"],
+                   memory=job.get("memory"),
+                   cache=job.get("cache", False))
+  except Exception:
+    logger.exception("Failed to process reply job %s", job_id)
+  await run_in_pool("io", complete_job, job_id)
+
+
+async def run_worker(token):
+  client = discord.Client(intents=discord.Intents.none())
+  await client.login(token)
+  history_store = create_history_store(config)
+  concurrency = asyncio.Semaphore(config.get('WORKER_CONCURRENCY', 8))
+  tasks = {asyncio.create_task(watch_config())}
+  logger.info("Worker %s started", worker_id)
+  try:
+    while True:
+      await concurrency.acquire()
+      claimed = await run_in_pool("io", claim_job, worker_id)
+      if claimed is None:
+        concurrency.release()
+        await asyncio.sleep(config.get('WORKER_POLL_INTERVAL', 0.5))
+        continue
+      task = asyncio.create_task(process_job(client, history_store, *claimed))
+      tasks.add(task)
+      task.add_done_callback(tasks.discard)
+      task.add_done_callback(lambda _: concurrency.release())
+  finally:
+    await client.close()
+
+
+if __name__ == "__main__":
+  if config.get('HISTORY_BACKEND', 'memory') != 'sqlite':
+    raise SystemExit("Workers require HISTORY_BACKEND: sqlite in config.yml")
+  try:
+    asyncio.run(run_worker(os.environ["DISCORD_TOKEN"]))
+  finally:
+    shutdown_pools()